@@ -0,0 +1,76 @@
+import os
+import shutil
+import zipfile
+import zlib
+from typing import List
+
+class ArchiveManager:
+    """Archive manager for extracting zip artifacts in process.
+
+    Entries are streamed from the archive straight into the target
+    directory, entries that are already present with a matching size and
+    CRC are skipped and file permissions stored in the archive are restored
+    in the same pass. Archives are extracted by the worker that downloaded
+    them, so with the [ParallelDownloadManager] independent archives are
+    extracted concurrently (zlib releases the GIL while decompressing).
+
+    """
+    CHUNK_SIZE = 1024 * 1024
+
+    def _crc32(self, path: str) -> int:
+        crc = 0
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b''):
+                crc = zlib.crc32(chunk, crc)
+        return crc
+
+    def _unchanged(self, path: str, info: zipfile.ZipInfo) -> bool:
+        return os.path.isfile(path) and os.path.getsize(path) == info.file_size and self._crc32(path) == info.CRC
+
+    def _target(self, destination: str, name: str) -> str:
+        target = os.path.realpath(os.path.join(destination, name))
+        if not target.startswith(os.path.realpath(destination) + os.sep):
+            raise ValueError(f'Archive entry {name} is outside of {destination}')
+        return os.path.join(destination, name)
+
+    def extract(self, archive: str, destination: str, executables: List[str] = None, remove: bool = True) -> List[str]:
+        """Extract a zip archive into a directory
+
+        Args:
+            archive:
+                The path of the zip archive.
+            destination:
+                The directory to extract into.
+            executables:
+                File names that should be made executable e.g. the cenm launcher.
+            remove:
+                If true, removes the archive once extracted.
+
+        Returns:
+            The paths of all files in the archive, relative to the destination.
+
+        """
+        executables = executables or []
+        os.makedirs(destination, exist_ok=True)
+        files = []
+        with zipfile.ZipFile(archive) as zf:
+            for info in zf.infolist():
+                target = self._target(destination, info.filename)
+                if info.is_dir():
+                    os.makedirs(target, exist_ok=True)
+                    continue
+                files.append(info.filename)
+                if not self._unchanged(target, info):
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    # Write to a new file so hardlinked copies of the old file are left untouched
+                    with zf.open(info) as src, open(f'{target}.tmp', 'wb') as dst:
+                        shutil.copyfileobj(src, dst, self.CHUNK_SIZE)
+                    os.replace(f'{target}.tmp', target)
+                mode = (info.external_attr >> 16) & 0o777
+                if os.path.basename(info.filename) in executables:
+                    mode = (mode or 0o644) | 0o111
+                if mode:
+                    os.chmod(target, mode)
+        if remove:
+            os.remove(archive)
+        return files
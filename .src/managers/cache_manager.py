@@ -0,0 +1,192 @@
+import fcntl
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from time import time
+from typing import Dict, Optional
+from utils import SystemInteract, Constants
+
+class CacheManager:
+    """User level artifact cache shared between checkouts and clean cycles.
+
+    Artifacts are stored once by their sha256 checksum under ``blobs/`` and
+    an index maps each artifact file name (which holds the artifact name and
+    version) to its checksum. Cached artifacts are materialised by hardlink,
+    falling back to a reflink and then a plain copy when the cache lives on
+    a different filesystem. The least recently used artifacts are evicted
+    once the cache grows past its maximum size.
+
+    Args:
+        cache_dir:
+            The cache directory, defaults to $CENM_CACHE_DIR or ~/.cache/cenm-deployment-local.
+        max_size:
+            The maximum cache size in bytes, defaults to $CENM_CACHE_MAX_SIZE_GB or 10GB.
+
+    """
+    def __init__(self, cache_dir: str = None, max_size: int = None):
+        self.cache_dir = os.path.expanduser(cache_dir or os.environ.get('CENM_CACHE_DIR', Constants.CACHE_DIR.value))
+        self.max_size = max_size or int(float(os.environ.get('CENM_CACHE_MAX_SIZE_GB', Constants.CACHE_MAX_SIZE_GB.value)) * 1024**3)
+        self.blob_dir = os.path.join(self.cache_dir, 'blobs')
+        self.index_file = os.path.join(self.cache_dir, 'index.json')
+        self.sysi = SystemInteract()
+
+    @contextmanager
+    def _locked_index(self):
+        """Lock the cache index across threads, processes and checkouts
+
+        """
+        os.makedirs(self.blob_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                index = self._read_index()
+                yield index
+                self._write_index(index)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_index(self) -> Dict:
+        try:
+            with open(self.index_file, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {'artifacts': {}, 'stats': {'hits': 0, 'misses': 0}}
+
+    def _write_index(self, index: Dict):
+        tmp_file = f'{self.index_file}.{os.getpid()}.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_file, self.index_file)
+
+    def _blob(self, checksum: str) -> str:
+        return os.path.join(self.blob_dir, checksum)
+
+    def _sha256(self, path: str) -> str:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    def _evict(self, index: Dict):
+        artifacts = index['artifacts']
+        blobs = {entry['sha256']: entry['size'] for entry in artifacts.values()}
+        total = sum(blobs.values())
+        for name, entry in sorted(artifacts.items(), key=lambda item: item[1]['last_used']):
+            if total <= self.max_size:
+                break
+            del artifacts[name]
+            # Blobs can be shared by more than one artifact name
+            if entry['sha256'] not in [e['sha256'] for e in artifacts.values()]:
+                self.sysi.remove(self._blob(entry['sha256']), silent=True)
+                total -= entry['size']
+
+    def fetch(self, name: str, destination: str) -> bool:
+        """Materialise a cached artifact
+
+        Args:
+            name:
+                The artifact file name e.g. identitymanager-1.6.zip.
+            destination:
+                The path to materialise the artifact to.
+
+        Returns:
+            True if the artifact was found in the cache, False otherwise.
+
+        """
+        with self._locked_index() as index:
+            entry = index['artifacts'].get(name)
+            blob = self._blob(entry['sha256']) if entry else None
+            if not entry or not os.path.exists(blob) or os.path.getsize(blob) != entry['size']:
+                index['artifacts'].pop(name, None)
+                index['stats']['misses'] += 1
+                return False
+            if os.path.exists(destination):
+                os.remove(destination)
+            self.sysi.link(blob, destination)
+            entry['last_used'] = time()
+            index['stats']['hits'] += 1
+            return True
+
+    def store(self, name: str, path: str, checksums: Dict[str, str] = None) -> Optional[str]:
+        """Add a downloaded artifact to the cache
+
+        Args:
+            name:
+                The artifact file name e.g. identitymanager-1.6.zip.
+            path:
+                The path of the downloaded artifact.
+            checksums:
+                Checksums already computed for the artifact keyed by algorithm.
+
+        Returns:
+            The sha256 checksum of the artifact.
+
+        """
+        checksums = checksums or {}
+        checksum = checksums.get('sha256') or self._sha256(path)
+        with self._locked_index() as index:
+            if not os.path.exists(self._blob(checksum)):
+                self.sysi.link(path, f'{self._blob(checksum)}.tmp')
+                os.replace(f'{self._blob(checksum)}.tmp', self._blob(checksum))
+            index['artifacts'][name] = {
+                'sha256': checksum,
+                'size': os.path.getsize(path),
+                'checksums': {**checksums, 'sha256': checksum},
+                'last_used': time()
+            }
+            self._evict(index)
+        return checksum
+
+    def checksums(self, name: str) -> Dict[str, str]:
+        """Get the checksums recorded for a cached artifact when it was downloaded
+
+        Args:
+            name:
+                The artifact file name e.g. identitymanager-1.6.zip.
+
+        Returns:
+            A dictionary of checksums keyed by algorithm, empty if the artifact is not cached.
+
+        """
+        entry = self._read_index()['artifacts'].get(name, {})
+        return entry.get('checksums', {'sha256': entry['sha256']} if entry else {})
+
+    def stats(self) -> Dict[str, int]:
+        """Get cache statistics
+
+        Returns:
+            A dictionary with the number of hits, misses, cached artifacts and the cache size.
+
+        """
+        index = self._read_index()
+        blobs = {entry['sha256']: entry['size'] for entry in index['artifacts'].values()}
+        return {
+            **index['stats'],
+            'artifacts': len(index['artifacts']),
+            'size': sum(blobs.values())
+        }
+
+    def print_stats(self):
+        stats = self.stats()
+        lookups = stats['hits'] + stats['misses']
+        hit_rate = f'{100 * stats["hits"] / lookups:.0f}%' if lookups else 'n/a'
+        print("""
+Artifact cache ({})
+=====================================
+
+Cached artifacts: {}
+Cache size:       {:.1f}MB / {:.1f}MB
+Hits:             {}
+Misses:           {}
+Hit rate:         {}
+        """.format(
+            self.cache_dir,
+            stats['artifacts'],
+            stats['size'] / 1024**2,
+            self.max_size / 1024**2,
+            stats['hits'],
+            stats['misses'],
+            hit_rate
+        ))
@@ -0,0 +1,96 @@
+import hashlib
+import os
+from typing import Dict, List, Tuple
+
+class CdsManager:
+    """Class data sharing archives of the java artifacts.
+
+    The first launch of a jar with a java version supporting dynamic
+    archives (13 and later) writes the classes it loaded to an archive next
+    to the jar when the JVM exits, later launches map the archive instead
+    of loading and verifying the same classes from the jar again. The sha256
+    checksum, size and modification time of the jar the archive was built
+    from are kept in a sidecar, an archive whose jar has changed is rebuilt
+    on the next launch. The JVM itself rejects an archive once the size or
+    modification time of its jar changed, even if the content is the same.
+
+    Archives are off unless enabled, a jar run for different purposes e.g.
+    networkmap.jar as a service and to set the network parameters gets an
+    archive per purpose through its label.
+
+    Args:
+        java_version:
+            The java version the jar is run with.
+
+    """
+    MIN_JAVA_VERSION = 13
+    CHUNK_SIZE = 1024 * 1024
+
+    enabled = False
+    # Checksums of the jars keyed by path, size and modification time, so unchanged jars are only read once
+    _checksums: Dict[Tuple[str, int, int], str] = {}
+
+    def __init__(self, java_version: int):
+        self.java_version = java_version
+
+    def supported(self) -> bool:
+        return self.enabled and self.java_version >= self.MIN_JAVA_VERSION
+
+    def archive(self, jar: str, label: str = None) -> str:
+        return f'{jar}.{label}.java{self.java_version}.jsa' if label else f'{jar}.java{self.java_version}.jsa'
+
+    def _checksum(self, jar: str) -> str:
+        stat = os.stat(jar)
+        key = (os.path.abspath(jar), stat.st_size, stat.st_mtime_ns)
+        if key not in self._checksums:
+            sha = hashlib.sha256()
+            with open(jar, 'rb') as f:
+                for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b''):
+                    sha.update(chunk)
+            self._checksums[key] = sha.hexdigest()
+        return self._checksums[key]
+
+    def _fingerprint(self, jar: str) -> str:
+        stat = os.stat(jar)
+        return f'{self._checksum(jar)} {stat.st_size} {stat.st_mtime_ns}'
+
+    def is_valid(self, jar: str, label: str = None) -> bool:
+        """Check if the archive of a jar exists and was built from the jar as it is now
+
+        """
+        archive = self.archive(jar, label)
+        try:
+            with open(f'{archive}.sha256', 'r') as f:
+                return os.path.exists(archive) and f.read().strip() == self._fingerprint(jar)
+        except OSError:
+            return False
+
+    def flags(self, jar: str, label: str = None) -> List[str]:
+        """Get the JVM flags using the archive of a jar, or building it if missing or out of date
+
+        Args:
+            jar:
+                The path of the jar.
+            label:
+                What the jar is run for, if it is run for more than one thing.
+
+        Returns:
+            The JVM flags, none if archives are disabled, not supported by the java version or the jar is missing.
+
+        """
+        if not self.supported() or not os.path.exists(jar):
+            return []
+        archive = self.archive(jar, label)
+        if self.is_valid(jar, label):
+            return [f'-XX:SharedArchiveFile={os.path.abspath(archive)}']
+        if os.path.exists(archive):
+            os.remove(archive)
+        with open(f'{archive}.sha256', 'w') as f:
+            f.write(f'{self._fingerprint(jar)}\n')
+        return [f'-XX:ArchiveClassesAtExit={os.path.abspath(archive)}']
+
+    def java(self, jar: str, label: str = None) -> str:
+        """Get the java command of a jar for shell command lines, e.g. to run a tool
+
+        """
+        return ' '.join(['java', *self.flags(jar, label), '-jar', os.path.basename(jar)])
@@ -1,4 +1,5 @@
 from utils import SystemInteract, Logger, java_string, get_cenm_java_version
+from managers.cds_manager import CdsManager
 from typing import List
 from services.base_services import DeploymentService
 
@@ -107,7 +108,7 @@ class CertificateManager:
 
         if not all(certs.values()):
             print('Generating certificates')
-            exits.append(self.sysi.run_get_exit_code(f'(cd cenm-pki && {java_string(self.java_version)} && java -jar pkitool.jar -f pki.conf)'))
+            exits.append(self.sysi.run_get_exit_code(f'(cd cenm-pki && {java_string(self.java_version)} && {CdsManager(self.java_version).java("cenm-pki/pkitool.jar")} -f pki.conf)'))
         self._distribute_certs()
         return max(exits)
 
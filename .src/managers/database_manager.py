@@ -1,5 +1,6 @@
 import os
-from typing import List
+import re
+from typing import Dict, List, Set
 from managers.download_manager import DownloadManager
 from services.base_services import BaseService
 from utils import SystemInteract, Constants
@@ -7,6 +8,11 @@ from utils import SystemInteract, Constants
 class DatabaseManager:
     """Database manager for handling database drivers.
 
+    The config of every service that needs a database is read to find the
+    JDBC driver it uses, only drivers that are actually referenced are
+    downloaded. Each driver is downloaded once and hardlinked into the
+    drivers directory of every service that needs it.
+
     Args:
         services:
             A list of services that need db drivers.
@@ -14,16 +20,17 @@ class DatabaseManager:
             A download manager.
 
     """
-    
-    def __init__(self, 
+
+    def __init__(self,
         services: List[BaseService],
         dlm: DownloadManager
     ):
-        self.db_drivers = [
-            Constants.MSSQL_DRIVER.value,
-            Constants.POSTGRES_DRIVER.value,
-            Constants.ORACLE_DRIVER.value
-        ]
+        # Patterns identifying each driver in a config, by jdbc url or driver/data source class
+        self.db_drivers = {
+            Constants.MSSQL_DRIVER.value: re.compile(r'jdbc:sqlserver:|com\.microsoft\.sqlserver\.'),
+            Constants.POSTGRES_DRIVER.value: re.compile(r'jdbc:postgresql:|org\.postgresql\.'),
+            Constants.ORACLE_DRIVER.value: re.compile(r'jdbc:oracle:|oracle\.jdbc\.')
+        }
         self.services_with_db = services
         self.dlm = dlm
         self.sysi = SystemInteract()
@@ -31,45 +38,86 @@ class DatabaseManager:
     def _get_jar_name(self, url):
         return url.split('/')[-1]
 
-    def _copy(self, source, destination):
-        self.sysi.run(f'cp {source} {destination}')
+    def _drivers_dir(self, service: BaseService) -> str:
+        return f'{service.dir}/drivers'
 
-    def _exists(self, driver):
-        jar_file = self._get_jar_name(driver)
-        exists_in_service = {}
+    def _config_path(self, service: BaseService) -> str:
+        # The zone service is configured on the command line, see run.sh
+        return f'{service.dir}/{service.config_file}' if service.config_file else f'{service.dir}/run.sh'
+
+    def _required_drivers(self) -> Dict[str, List[BaseService]]:
+        """Find the drivers referenced by each service config
+
+        Returns:
+            A dictionary of the services that need each driver, keyed by driver url.
+
+        """
+        required = {}
         for service in self.services_with_db:
-            for _, _, files in os.walk(f'{service.dir}'):
-                if jar_file in files:
-                    exists_in_service[service.abb] = True
-            if service.abb not in exists_in_service:
-                exists_in_service[service.abb] = False
-        return exists_in_service
+            try:
+                with open(self._config_path(service), 'r') as f:
+                    config = f.read()
+            except FileNotFoundError:
+                continue
+            for driver, pattern in self.db_drivers.items():
+                if pattern.search(config):
+                    required.setdefault(driver, []).append(service)
+        return required
+
+    def _installed_drivers(self) -> Dict[str, Set[str]]:
+        """List the jars in the drivers directory of every service in a single pass
 
-    def _cleanup(self, driver):
-        self.sysi.remove(self._get_jar_name(driver))
+        Returns:
+            A dictionary of installed jar names keyed by service abbreviation.
 
-    def _distribute_drivers(self, exists_dict):
+        """
+        installed = {}
         for service in self.services_with_db:
-            if not self.sysi.path_exists(f'{service.dir}/drivers'):
-                self.sysi.run(f'{service.dir}/drivers')
-        for driver, exists in exists_dict.items():
-            if not all(exists.values()):
-                for service in self.services_with_db:
-                    if not exists[service.abb]:
-                        self._copy(self._get_jar_name(driver), f'{service.dir}/drivers')
-            self._cleanup(driver)
+            try:
+                installed[service.abb] = set(os.listdir(self._drivers_dir(service)))
+            except FileNotFoundError:
+                installed[service.abb] = set()
+        return installed
 
-    def download(self):
-        download_errors = {}
-        exists_dict = {}
+    def _distribute_driver(self, driver: str, services: List[BaseService]) -> int:
+        """Link a downloaded driver into the drivers directory of each service
+
+        Returns:
+            The disk space saved in bytes compared to a copy per service.
 
-        for driver in self.db_drivers:
-            exists_dict[driver] = self._exists(driver)
+        """
+        jar_file = self._get_jar_name(driver)
+        inode = os.stat(jar_file).st_ino
+        linked = 0
+        for service in services:
+            os.makedirs(self._drivers_dir(service), exist_ok=True)
+            target = f'{self._drivers_dir(service)}/{jar_file}'
+            self.sysi.link(jar_file, target)
+            if os.stat(target).st_ino == inode:
+                linked += 1
+        size = os.path.getsize(jar_file)
+        self.sysi.remove(jar_file, silent=True)
+        # One copy of the driver is needed either way
+        return max(linked - 1, 0) * size
 
-        for driver, exists in exists_dict.items():
-            if not all(exists.values()):
-                print(f'Downloading {self._get_jar_name(driver)}')
-                download_errors[(self._get_jar_name(driver), '')] = self.dlm.download(driver)
+    def download(self):
+        download_errors = {}
+        required = self._required_drivers()
+        if not required:
+            print('No database drivers required, all services use H2')
+            return download_errors
 
-        self._distribute_drivers(exists_dict)
-        return download_errors
\ No newline at end of file
+        installed = self._installed_drivers()
+        saved = 0
+        for driver, services in required.items():
+            jar_file = self._get_jar_name(driver)
+            missing = [service for service in services if jar_file not in installed[service.abb]]
+            if not missing:
+                continue
+            print(f'Downloading {jar_file} for {", ".join(service.abb for service in missing)}')
+            download_errors[(jar_file, '')] = self.dlm.download(driver)
+            if not download_errors[(jar_file, '')]:
+                saved += self._distribute_driver(driver, missing)
+        if saved:
+            print(f'Database drivers hardlinked, saved {saved / 1024**2:.1f}MB compared to copying')
+        return download_errors
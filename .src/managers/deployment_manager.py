@@ -1,27 +1,56 @@
 import glob
-import multiprocessing
-from typing import List, Dict
-from time import sleep
+import threading
+from typing import List, Dict, Optional
+from time import time
 from utils import Logger, SystemInteract, CenmTool
+from managers.resource_manager import ResourceManager
+from managers.state_manager import StateManager
+from managers.supervisor_manager import SupervisorManager
+from managers.timings_manager import TimingsManager
+from managers.trace_manager import TraceManager, traced
 from services.base_services import DeploymentService
 
+SUBZONE_SETUP = 'subzone-setup'
+
 class DeploymentManager:
     """Deployment manager for handling a standard CENM deployment.
 
+    Services are started as a dependency graph: each service is started as
+    soon as every service it depends on is ready, so services that don't
+    depend on each other start in parallel. The subzone setup is part of
+    the graph and runs once auth, gateway and zone are ready. Nodes can be
+    added to the same graph, so they register as soon as the identity
+    manager is ready. Starting services, restarting them and logging their
+    status all run in the supervisor loop. When traced, the critical path
+    through the graph is logged once every service is ready.
+
     Args:
         services:
             A list of services to deploy.
+        state:
+            Where the state of the services is kept, the CENM deployment state by default.
 
     """
 
-    def __init__(self, services: List[DeploymentService]):
-        self.deployment_services = {f'{s.artifact_name}-{s.dir}': s for s in services}
-        self.functions = {f'{s.artifact_name}-{s.dir}': s.deploy for s in services}
-        self.processes = []
+    def __init__(self, services: List[DeploymentService], state: StateManager = None):
+        self.deployment_services = {}
+        self.functions = {}
         self.versions = self._get_version_dict()
         self.logger = Logger().get_logger(__name__)
+        self.supervisor = SupervisorManager(self.functions, self.logger, state)
+        self.add_services(services)
         self.sysi = SystemInteract()
+        self.timings = TimingsManager()
     
+    def add_services(self, services: List[DeploymentService]):
+        """Deploy more services with the same supervisor e.g. nodes
+
+        """
+        for s in services:
+            self.deployment_services[f'{s.artifact_name}-{s.dir}'] = s
+            self.functions[f'{s.artifact_name}-{s.dir}'] = s.launch
+            self.supervisor.details[f'{s.artifact_name}-{s.dir}'] = {'ports': s.ports(), 'ready': False}
+
     def _run_subzone_setup(self) -> bool:
         return all(service in self.deployment_services.keys() for service in ["accounts-application-cenm-auth", "gateway-service-cenm-gateway", "zone-cenm-zone"]) and (not self._node_info())
 
@@ -33,9 +62,11 @@ class DeploymentManager:
     def _node_info(self) -> bool:
         return glob.glob(f'cenm-nmap/nodeInfo-*') and glob.glob(f'cenm-notary/nodeInfo*')
     
+    @traced
     def _setup_auth(self):
         self.logger.info("Running initial setupAuth.sh")
-        self.sysi.run("(cd cenm-auth/setup-auth && bash setupAuth.sh)")
+        with TraceManager.span('setupAuth.sh'):
+            self.sysi.run("(cd cenm-auth/setup-auth && bash setupAuth.sh)")
 
         cenm_tool = CenmTool(self.versions['NMS_VISUAL_VERSION'])
 
@@ -48,88 +79,214 @@ class DeploymentManager:
             self.logger.info(f"Subzones: {zones}, will only set permissions for {zones[0]}")
             self.sysi.run(f'(cd cenm-auth/setup-auth/roles && for file in *.json; do perl -i -pe "s/<SUBZONE_ID>/{zones[0]}/g" $file; done)')
             self.logger.info("Running setupAuth.sh with updated zone permissions")
-            self.sysi.run("(cd cenm-auth/setup-auth && bash setupAuth.sh)")
+            with TraceManager.span('setupAuth.sh', zone=zones[0]):
+                self.sysi.run("(cd cenm-auth/setup-auth && bash setupAuth.sh)")
             self.logger.info("Setting subzone config")
             token = cenm_tool.cenm_set_subzone_config(zones[0])
             self.logger.info(f"Subzone network map token: {token}")
 
-    def _wait_for_service_termination(self):
-            def _get_processes() -> int:
-                return int(self.sysi.run_get_stdout(
-                    'ps | grep -E ".*(cd cenm-[a-z]+ \&\&.*\&\& java -jar).+(\.jar).+(\.conf)*.*" | wc -l | sed -e "s/^ *//g"'
-                ))
-            def _is_network_map_running() -> bool:
-                return int(self.sysi.run_get_stdout(
-                    'ps | grep -E ".*(java -jar networkmap\.jar.*\.conf).*" | wc -l | sed -e "s/^ *//g"'
-                )) != 0
-
-            java_processes = _get_processes()
-            while int(java_processes) > 0:
-                self.logger.info(f'Waiting for {java_processes} processes to terminate')
-                sleep(5)
-                java_processes = _get_processes()
-
-            if _is_network_map_running():
-                self.logger.info('Network map still running, terminating')
-                nm_pid = self.sysi.run_get_stdout('ps | grep -E ".*(java -jar networkmap\.jar.*\.conf).*" | cut -d " " -f 1 | sed -e "s/^ *//g"')
-                self.sysi.run(f'kill -9 {nm_pid}', silent=True)
-                sleep(10)
-                if _is_network_map_running():
-                    nm_pid = self.sysi.run_get_stdout('ps | grep -E ".*(java -jar networkmap\.jar.*\.conf).*" | cut -d " " -f 1 | sed -e "s/^ *//g"')
-                    print("""
-The script failed to terminate the network map process. Please terminate the process manually by running:
-    kill -9 {0}""".format(nm_pid))
+    def _dependencies(self) -> Dict[str, List[str]]:
+        """Resolve the dependencies of every service to the services being deployed
+
+        Returns:
+            A dictionary of the services each service depends on, keyed by service.
+
+        """
+        by_dir = {s.dir: name for name, s in self.deployment_services.items()}
+        dependencies = {}
+        for name, service in self.deployment_services.items():
+            dependencies[name] = []
+            for dependency in service.depends_on:
+                if f'cenm-{dependency}' in by_dir:
+                    dependencies[name].append(by_dir[f'cenm-{dependency}'])
                 else:
-                    self.logger.info('Network map terminated')
+                    self.logger.info(f'{name} depends on {dependency} which is not deployed, ignoring')
+        if self.run_subzone_setup:
+            dependencies[SUBZONE_SETUP] = [by_dir[dir] for dir in ['cenm-auth', 'cenm-gateway', 'cenm-zone']]
+        self._check_acyclic(dependencies)
+        return dependencies
+
+    def _check_acyclic(self, dependencies: Dict[str, List[str]]):
+        remaining = {name: set(deps) for name, deps in dependencies.items()}
+        while remaining:
+            free = [name for name, deps in remaining.items() if not deps]
+            if not free:
+                raise ValueError(f'Circular service dependencies between {", ".join(remaining)}')
+            for name in free:
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(free)
+
+    def _start(self, name: str):
+        if name == SUBZONE_SETUP:
+            self.subzone_setup = threading.Thread(target=self._setup_auth, name=name, daemon=True)
+            self.subzone_setup.start()
+            return
+        self.supervisor.start(name)
+
+    def _is_ready(self, name: str) -> bool:
+        if name == SUBZONE_SETUP:
+            return not self.subzone_setup.is_alive()
+        return self.deployment_services[name].is_ready()
+
+    def _estimate(self, dependencies: Dict[str, List[str]]) -> float:
+        """Estimate the time until every service is ready from the recorded startup times
+
+        """
+        finish = {}
+        def _finish(name: str) -> float:
+            if name not in finish:
+                own = self.timings.estimate(self.deployment_services[name]) if name in self.deployment_services else 0
+                finish[name] = max([_finish(dep) for dep in dependencies[name]], default=0) + own
+            return finish[name]
+        return max(_finish(name) for name in dependencies)
+
+    def _refresh_readiness(self):
+        """Check again the readiness of services that were restarted
 
-    def deploy_services(self, health_check_frequency: int):
+        """
+        status = self.supervisor.status()
+        for name, details in self.supervisor.details.items():
+            if not details['ready'] and status.get(name, {}).get('state') == 'running' and self._is_ready(name):
+                details['ready'] = True
+                self.logger.info(f'{name} ready again')
+                self.supervisor.publish()
+
+    def _critical_path(self) -> List[str]:
+        """Get the chain of services that held up the deployment, each waiting on the one before it
+
+        """
+        path = []
+        name = max(self.ready_at, key=self.ready_at.get)
+        while name:
+            path.append(name)
+            name = max(self.dependencies[name], key=lambda dep: self.ready_at[dep], default=None)
+        return path[::-1]
+
+    def _log_critical_path(self):
+        path = self._critical_path()
+        self.logger.info(f'Critical path, {self.ready_at[path[-1]] - self.start:.1f} seconds:')
+        for name in path:
+            started, ready = self.started_at[name] - self.start, self.ready_at[name] - self.start
+            steps = ', '.join(f'{step} {seconds:.1f}s' for step, seconds in TraceManager.spans(name, self.started_at[name], self.ready_at[name])[:3])
+            self.logger.info(f'  {name}: started at {started:.1f}s, ready at {ready:.1f}s ({ready - started:.1f}s){f", longest steps {steps}" if steps else ""}')
+
+    @traced
+    def _plan(self):
+        """Resolve the dependency graph and reset the startup state
+
+        """
+        self.dependencies = self._dependencies()
+        self.logger.info(f'All services expected to be ready in about {self._estimate(self.dependencies):.0f} seconds')
+        self.start = self.logged = time()
+        self.waiting = dict(self.dependencies)
+        self.started = []
+        self.started_at = {}
+        self.ready = set()
+        self.ready_at = {}
+        self.finished = None
+
+    def _schedule(self) -> Optional[float]:
+        """Start every service whose dependencies are ready and check which started services are ready
+
+        Run by the supervisor loop, once every service is ready it keeps
+        checking the readiness of services that were restarted.
+
+        Returns:
+            The seconds until it needs to run again.
+
+        """
+        for name in self.started:
+            if name not in self.ready and self._is_ready(name):
+                self.ready.add(name)
+                self.ready_at[name] = time()
+                self.logger.info(f'{name} ready after {time() - self.start:.0f} seconds')
+                service = self.deployment_services.get(name)
+                TraceManager.record(name, self.started_at[name], self.ready_at[name], 'service', track=name, ready_by=service.ready_by if service else None)
+                if service:
+                    self.supervisor.details[name]['ready'] = True
+                    self.supervisor.publish()
+                # Only JVM startups, a node that is already registered counts as ready without being started
+                if service and service.launched and service.ready_by not in ['timeout', 'registered']:
+                    self.timings.record(service, self.ready_at[name] - service.launched, service.ready_by)
+        for name, deps in list(self.waiting.items()):
+            if all(dep in self.ready for dep in deps):
+                self.logger.info(f'attempting to deploy {name}')
+                self.started_at[name] = time()
+                self._start(name)
+                self.started.append(name)
+                del self.waiting[name]
+        if len(self.ready) == len(self.dependencies):
+            if not self.finished:
+                self.finished = time()
+                self.logger.info(f'All services ready after {self.finished - self.start:.0f} seconds')
+                self.supervisor.log_status()
+                if TraceManager.enabled:
+                    TraceManager.record('deployment', self.start, self.finished, 'service', track='deployment')
+                    self._log_critical_path()
+                    self._write_trace()
+            self._refresh_readiness()
+            return 5
+        if time() - self.logged > 30:
+            self.logged = time()
+            self.logger.info(f'Waiting for {", ".join(name for name in self.dependencies if name not in self.ready)}')
+        return 0.5
+
+    def _write_trace(self):
+        TraceManager.write(self.trace_file)
+        self.logger.info(f'Deployment trace written to {self.trace_file}')
+
+    def deploy_services(self, health_check_frequency: int, sample_interval: int = 5, samples_file: str = None, trace_file: str = None):
         """Deploy services in a standard CENM deployment.
+
+        Args:
+            health_check_frequency:
+                Seconds between logging the status of every service.
+            sample_interval:
+                Seconds between sampling the resources used by every service.
+            samples_file:
+                A CSV or JSON file the resource samples are written to on shutdown.
+            trace_file:
+                A JSON file the Chrome trace of the deployment steps is written
+                to once every service is ready and again on shutdown.
         
         """
+        self.trace_file = trace_file
+        if trace_file:
+            TraceManager.enable()
+        resources = ResourceManager(self.supervisor.processes, sample_interval)
         try:
+            if resources.available():
+                resources.start()
+            else:
+                self.logger.info('No /proc on this platform, resources used by services are not sampled')
             self.run_subzone_setup = self._run_subzone_setup()
             self.logger.info("Starting the cenm deployment")
-            service_deployments = '\n'.join([f'{service}: {service_info}' for service, service_info in self.functions.items()])
+            service_deployments = '\n'.join([
+                f'{name}: java {service.java_version}, {" ".join(service.jvm_flags()) or "JVM defaults"}'
+                for name, service in self.deployment_services.items()
+            ])
             self.logger.info(f'Deploying:\n\n{service_deployments}\n')
-            for service, function in self.functions.items():
-                service_object = self.deployment_services[service]
-                self.logger.info(f'attempting to deploy {service}')
-                process = multiprocessing.Process(target=function, name=service, daemon=True)
-                self.processes.append(process)
-                process.start()
-                self.logger.info(f'deployed {service} waiting {service_object.deployment_time} seconds until next service')
-                sleep(service_object.deployment_time)
-
-            if self.run_subzone_setup:
-                self.logger.info('All services deployed, setting up subzones')
-                self._setup_auth()
-                self.logger.info('Subzones setup')
-            
-            self.logger.info('Starting health check')
-            while True:
-                self.logger.info('Running process health check')
-                for process in self.processes:
-                    process.join(timeout=0)
-                    if process.is_alive():
-                        self.logger.info(f'{process} is healthy')
-                    else:
-                        self.logger.error(f'{process} is unhealthy, restarting')
-                        process.terminate()
-                        self.processes.remove(process)
-                        new_process = multiprocessing.Process(target=self.functions[process.name], name=process.name, daemon=True)
-                        new_process.start()
-                        self.processes.append(new_process)
-                sleep(health_check_frequency)
+            self._plan()
+            self.supervisor.supervise(health_check_frequency, self._schedule)
 
         except KeyboardInterrupt:
             self.logger.debug('Keyboard interrupt detected, terminating processes')
-            for process in self.processes:
-                self.logger.info(f'Terminating {process}')
-                process.terminate()
-                self.logger.info(f'Waiting for {process} to exit gracefully')
-                process.join()
-                
-            self._wait_for_service_termination()
+            interrupted = True
+        else:
+            interrupted = False
+        finally:
+            # Also run when supervision stopped because every service failed
+            self.supervisor.terminate()
+            resources.stop()
+            self.logger.info('Resources used by services:')
+            resources.log_summary(self.logger)
+            if samples_file:
+                resources.dump(samples_file)
+                self.logger.info(f'Resource samples written to {samples_file}')
+            if trace_file:
+                self._write_trace()
             self.sysi.remove(".tmp-*", silent=True)
             self.logger.info('All processes terminated, exiting')
+        if interrupted:
             exit(0)
\ No newline at end of file
@@ -1,24 +1,99 @@
+import base64
+import hashlib
+import http.client
 import os
+import random
+import threading
+from time import sleep, time
+from typing import Dict, List, Tuple, Optional
+from urllib.parse import urljoin, urlsplit
+from managers.cache_manager import CacheManager
 from utils import deprecated, SystemInteract
 
+class ConnectionPool:
+    """Pool of keep-alive http(s) connections, shared by all download managers.
+
+    Idle connections are kept per (scheme, host, port) so consecutive
+    downloads from the same host reuse the TCP connection and TLS session
+    instead of doing a fresh handshake for every artifact.
+
+    Args:
+        max_idle:
+            The maximum number of idle connections kept per host.
+        timeout:
+            The socket timeout in seconds.
+
+    """
+    def __init__(self, max_idle: int = 8, timeout: int = 60):
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.idle: Dict[Tuple[str, str, int], List[http.client.HTTPConnection]] = {}
+        self.lock = threading.Lock()
+
+    def _key(self, url: str) -> Tuple[str, str, int]:
+        parts = urlsplit(url)
+        return parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80)
+
+    def get(self, url: str) -> http.client.HTTPConnection:
+        key = self._key(url)
+        with self.lock:
+            if self.idle.get(key):
+                return self.idle[key].pop()
+        scheme, host, port = key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout)
+        return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+    def put(self, url: str, connection: http.client.HTTPConnection):
+        key = self._key(url)
+        with self.lock:
+            idle = self.idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(connection)
+                return
+        connection.close()
+
+CONNECTION_POOL = ConnectionPool()
+
 class DownloadManager:
-    """Download manager for interacting with wget or curl.
+    """Download manager for interacting with wget or curl, or downloading
+    natively over pooled keep-alive connections.
 
     Args:
         username:
             The username to use for the download.
         password:
             The password to use for the download.
+        retries:
+            The number of times to retry a failed download.
+        backend:
+            The download backend to use, either curl or python.
 
     """
+    BACKENDS = ['curl', 'python']
+    # curl exit codes for failed resumes (range error, bad resume)
+    RANGE_ERRORS = [33, 36]
+    CHUNK_SIZE = 1024 * 1024
+    # Checksum algorithms from strongest to weakest
+    CHECKSUMS = ['sha256', 'sha1', 'md5']
+    MAX_REDIRECTS = 5
     
     def __init__(self, 
         username: str, 
-        password: str
+        password: str,
+        retries: int = 5,
+        backend: str = 'curl'
     ):
         self.username = username
         self.password = password
+        self.retries = retries
+        self.backend = backend
+        self.base_backoff = 1
+        self.max_backoff = 30
         self.wget = False #self._is_wget_installed()
+        # Progress bars are disabled when downloading in parallel
+        self.silent = False
+        self.cache = CacheManager()
         self.sysi = SystemInteract()
 
     @deprecated
@@ -32,11 +107,102 @@ class DownloadManager:
         """
         return os.system('wget --version > /dev/null 2>&1') == 0
 
+    def _hashers(self) -> Dict[str, 'hashlib._Hash']:
+        return {algorithm: hashlib.new(algorithm) for algorithm in self.CHECKSUMS}
+
+    def _hash_file(self, path: str, hashers: Dict[str, 'hashlib._Hash'] = None) -> Dict[str, 'hashlib._Hash']:
+        hashers = hashers or self._hashers()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b''):
+                for hasher in hashers.values():
+                    hasher.update(chunk)
+        return hashers
+
+    def file_checksums(self, path: str) -> Dict[str, str]:
+        """Compute the checksums of a local file
+
+        Args:
+            path:
+                The file to compute checksums for.
+
+        Returns:
+            A dictionary of checksums keyed by algorithm (sha256, sha1, md5).
+
+        """
+        return {algorithm: hasher.hexdigest() for algorithm, hasher in self._hash_file(path).items()}
+
+    def _auth_header(self) -> Dict[str, str]:
+        credentials = base64.b64encode(f'{self.username}:{self.password}'.encode()).decode()
+        return {'Authorization': f'Basic {credentials}'}
+
+    def _checksums_from_headers(self, headers: Dict[str, str]) -> Dict[str, str]:
+        headers = {key.lower(): value for key, value in headers.items()}
+        return {
+            algorithm: headers[f'x-checksum-{algorithm}'].strip().lower()
+            for algorithm in self.CHECKSUMS
+            if headers.get(f'x-checksum-{algorithm}')
+        }
+
+    def _get(self, url: str, method: str = 'GET') -> Tuple[int, Dict[str, str], bytes]:
+        """Small request over a pooled connection e.g. a HEAD or a checksum sidecar
+
+        """
+        try:
+            connection, response, final_url = self._request(url, self._auth_header(), method)
+            body = response.read()
+            CONNECTION_POOL.put(final_url, connection)
+            return response.status, dict(response.getheaders()), body
+        except (OSError, http.client.HTTPException):
+            return -1, {}, b''
+
+    def remote_checksums(self, url: str, headers: Dict[str, str] = None) -> Dict[str, str]:
+        """Get the published checksums of an artifact without downloading it
+
+        The X-Checksum-* headers that Artifactory sends with every response
+        are used when available, otherwise the headers of a HEAD request and
+        finally the .sha256/.sha1/.md5 checksum sidecars.
+
+        Args:
+            url:
+                The url of the artifact.
+            headers:
+                Response headers already received for the artifact, if any.
+
+        Returns:
+            A dictionary of checksums keyed by algorithm.
+
+        """
+        checksums = self._checksums_from_headers(headers or {})
+        if not checksums:
+            status, head_headers, _ = self._get(url, method='HEAD')
+            if status == 200:
+                checksums = self._checksums_from_headers(head_headers)
+        for algorithm in self.CHECKSUMS:
+            if checksums:
+                break
+            status, _, body = self._get(f'{url}.{algorithm}')
+            if status == 200 and body:
+                checksums[algorithm] = body.decode(errors='ignore').split()[0].strip().lower()
+        return checksums
+
+    def verify_checksums(self, local: Dict[str, str], remote: Dict[str, str]) -> Optional[bool]:
+        """Compare local checksums against published ones using the strongest common algorithm
+
+        Returns:
+            True if the checksums match, False if they do not and None if
+            there is no common algorithm to compare.
+
+        """
+        for algorithm in self.CHECKSUMS:
+            if local.get(algorithm) and remote.get(algorithm):
+                return local[algorithm] == remote[algorithm]
+        return None
+
     def _get_md5sum(self, url: str) -> str:
-        return self.sysi.run_get_stdout(f'curl -L --progress-bar -u {self.username}:{self.password} {url} | md5sum | cut -d " " -f 1')
+        return self.remote_checksums(url).get('md5', '')
 
     def _validate_download(self, url: str) -> bool:
-        """Check the md5sum of the downloaded file against the one that would be downloaded
+        """Check the md5sum of the downloaded file against the published one
 
         Args:
             url:
@@ -51,10 +217,148 @@ class DownloadManager:
         return not self.check_md5sum(artifact, url)
 
     def check_md5sum(self, artifact_path: str, artifact_url: str) -> bool:
-        return self.sysi.run_get_stdout(f'md5sum {artifact_path} | cut -d " " -f 1') == self._get_md5sum(artifact_url)
+        return self.file_checksums(artifact_path)['md5'] == self._get_md5sum(artifact_url)
+
+    def _curl(self, url: str, part_file: str) -> Tuple[int, str]:
+        """Download to a partial file, resuming from its current size with a range request
+
+        Response headers are written to a .headers file next to the partial file.
+
+        Returns:
+            The curl exit code and the http status code of the response.
+
+        """
+        progress = '-sS' if self.silent else '--progress-bar'
+        out = self.sysi.run_get_stdout(
+            f'(curl --fail -L {progress} -C - -u {self.username}:{self.password} -D {part_file}.headers -o {part_file} -w "%{{http_code}}" {url}; echo " $?")'
+        ).split()
+        if len(out) != 2:
+            return -1, ''
+        return int(out[1]), out[0]
+
+    def _read_curl_headers(self, header_file: str) -> Dict[str, str]:
+        headers = {}
+        try:
+            with open(header_file, 'r', errors='ignore') as f:
+                # With -L every response is written, only keep the last one
+                block = f.read().strip().split('\n\n')[-1]
+            for line in block.splitlines()[1:]:
+                if ':' in line:
+                    key, value = line.split(':', 1)
+                    headers[key.strip()] = value.strip()
+        except FileNotFoundError:
+            pass
+        self.sysi.remove(header_file, silent=True)
+        return headers
+
+    def _curl_attempt(self, url: str, part_file: str) -> Tuple[bool, bool, Dict[str, str], Optional[Dict[str, str]]]:
+        exit_code, http_code = self._curl(url, part_file)
+        headers = self._read_curl_headers(f'{part_file}.headers')
+        # curl runs out of process so the checksums are computed once the file is on disk
+        return exit_code == 0, not (exit_code in self.RANGE_ERRORS or http_code == '416'), headers, None
+
+    def _request(self, url: str, headers: Dict[str, str], method: str = 'GET') -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse, str]:
+        """Send a request over a pooled connection, following redirects
+
+        Credentials are only sent to the host of the original url.
+
+        Returns:
+            The connection, the response and the final url.
+
+        """
+        host = urlsplit(url).hostname
+        for _ in range(self.MAX_REDIRECTS + 1):
+            connection = CONNECTION_POOL.get(url)
+            parts = urlsplit(url)
+            path = f'{parts.path}?{parts.query}' if parts.query else parts.path
+            request_headers = dict(headers)
+            if parts.hostname != host:
+                request_headers.pop('Authorization', None)
+            try:
+                connection.request(method, path, headers=request_headers)
+                response = connection.getresponse()
+            except (OSError, http.client.HTTPException):
+                # Idle connections may have been closed by the server, retry once on a new one
+                connection.close()
+                connection.request(method, path, headers=request_headers)
+                response = connection.getresponse()
+            if response.status in [301, 302, 303, 307, 308]:
+                location = response.getheader('Location')
+                response.read()
+                CONNECTION_POOL.put(url, connection)
+                url = urljoin(url, location)
+                continue
+            return connection, response, url
+        raise http.client.HTTPException(f'Too many redirects for {url}')
+
+    def _python_attempt(self, url: str, part_file: str) -> Tuple[bool, bool, Dict[str, str], Optional[Dict[str, str]]]:
+        """Download to a partial file over a pooled connection, resuming with a range request
+
+        Checksums are computed while the file is streamed to disk, when
+        resuming the bytes already on disk are hashed first.
+
+        Returns:
+            Whether the download succeeded, whether the partial file can be
+            resumed, the response headers and the checksums of the file.
+
+        """
+        headers = {**self._auth_header(), 'Connection': 'keep-alive'}
+        offset = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+        connection = None
+        try:
+            connection, response, final_url = self._request(url, headers)
+            response_headers = dict(response.getheaders())
+            if response.status == 416:
+                response.read()
+                CONNECTION_POOL.put(final_url, connection)
+                return False, False, response_headers, None
+            if response.status not in [200, 206]:
+                print(f'{url} returned error: {response.status} {response.reason}')
+                response.read()
+                CONNECTION_POOL.put(final_url, connection)
+                return False, True, response_headers, None
+            # A 200 means the server ignored the range request, start from scratch
+            hashers = self._hash_file(part_file) if response.status == 206 else self._hashers()
+            mode = 'ab' if response.status == 206 else 'wb'
+            expected = response.getheader('Content-Length')
+            received = 0
+            with open(part_file, mode) as f:
+                for chunk in iter(lambda: response.read(self.CHUNK_SIZE), b''):
+                    f.write(chunk)
+                    for hasher in hashers.values():
+                        hasher.update(chunk)
+                    received += len(chunk)
+            if expected is not None and received != int(expected):
+                connection.close()
+                return False, True, response_headers, None
+            if response.will_close:
+                connection.close()
+            else:
+                CONNECTION_POOL.put(final_url, connection)
+            return True, True, response_headers, {algorithm: hasher.hexdigest() for algorithm, hasher in hashers.items()}
+        except (OSError, http.client.HTTPException) as e:
+            print(f'Error downloading {url}: {e}')
+            if connection:
+                connection.close()
+            return False, True, {}, None
+
+    def _backoff(self, attempt: int):
+        """Sleep with exponential backoff and full jitter
+
+        """
+        delay = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+        print(f'Retrying in {delay:.1f}s (attempt {attempt + 2}/{self.retries + 1})')
+        sleep(delay)
 
     def download(self, url: str) -> bool:
-        """Download a file from a given url using wget or curl.
+        """Download a file from a given url using wget, curl or the python backend.
+
+        With curl or python the file is written to a .part file which is
+        resumed across retries (and across interrupted runs) using range
+        requests, verified against the published checksums of the artifact,
+        then atomically renamed once complete.
 
         Args:
             url: 
@@ -64,6 +368,14 @@ class DownloadManager:
             True if the download failed, False otherwise.
 
         """
+        artifact = url.split("/")[-1]
+        if self.cache.fetch(artifact, artifact):
+            print(f'Using cached {artifact}')
+            return False
+        # Never write into an existing file, it may be hardlinked to the cache
+        if os.path.exists(artifact):
+            os.remove(artifact)
+        checksums = None
         if self.wget:
             cmd = os.system(f'wget -q --show-progress --user {self.username} --password {self.password} {url}')
             if cmd != 0:
@@ -71,8 +383,34 @@ class DownloadManager:
                 if cmd2 != 0:
                     return True
         else:
-            cmd = os.system(f'curl --progress-bar -u {self.username}:{self.password} -O {url}')
-            if cmd != 0:
+            part_file = f'{artifact}.part'
+            offset = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+            if offset:
+                print(f'Resuming {artifact} from {offset} bytes')
+            attempt_download = self._python_attempt if self.backend == 'python' else self._curl_attempt
+            start = time()
+            for attempt in range(self.retries + 1):
+                success, resumable, headers, checksums = attempt_download(url, part_file)
+                if success:
+                    checksums = checksums or self.file_checksums(part_file)
+                    verified = self.verify_checksums(checksums, self.remote_checksums(url, headers))
+                    if verified is None:
+                        print(f'No published checksum found for {artifact}, skipping verification')
+                    if verified is not False:
+                        break
+                    print(f'Checksum mismatch for {artifact}, downloading again')
+                    resumable = False
+                if not resumable:
+                    # The partial file can't be resumed, start again from scratch
+                    self.sysi.remove(part_file, silent=True)
+                if attempt < self.retries:
+                    self._backoff(attempt)
+            else:
                 return True
+            elapsed = time() - start
+            size = os.path.getsize(part_file) / 1024**2
+            resumed = f', resumed from {offset} bytes' if offset else ''
+            print(f'Downloaded {artifact} with {self.backend}: {size:.1f}MB in {elapsed:.1f}s ({size / max(elapsed, 0.001):.1f}MB/s{resumed})')
+            os.replace(part_file, artifact)
+        self.cache.store(artifact, artifact, checksums)
         return False
-        # return not self._validate_download(url)
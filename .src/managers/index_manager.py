@@ -0,0 +1,102 @@
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+from utils import Constants
+
+class IndexManager:
+    """Presence index of the files in the service directories.
+
+    The index records the files and subdirectories of every directory
+    under the service directories together with the directory mtime, and
+    is kept on disk between runs. A lookup only stats each directory, a
+    directory is listed again when its mtime changed, i.e. when a file in
+    it was created, removed or renamed. Runtime directories such as h2,
+    logs and artemis never hold artifacts so they are not indexed.
+
+    Args:
+        index_file:
+            The path of the index file.
+        prune:
+            Directory names that are not indexed, defaults to the runtime directories.
+
+    """
+    # Shared by every service so the index is only read from disk once per run
+    _lock = threading.Lock()
+    _index = None
+
+    def __init__(self, index_file: str = Constants.INDEX_FILE.value, prune: List[str] = None):
+        self.index_file = index_file
+        self.prune = set(prune or Constants.RUNTIME_FILES.value['dirs']) | {'.git'}
+
+    def _read(self) -> Dict[str, Dict]:
+        try:
+            with open(self.index_file, 'r') as f:
+                return json.load(f)['dirs']
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return {}
+
+    def _write(self, dirs: Dict[str, Dict]):
+        tmp_file = f'{self.index_file}.{os.getpid()}.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({'version': 1, 'dirs': dirs}, f)
+        os.replace(tmp_file, self.index_file)
+
+    def _under(self, path: str, root: str) -> bool:
+        return path == root or path.startswith(f'{root}/')
+
+    def _scan(self, path: str, old: Dict[str, Dict], new: Dict[str, Dict]) -> bool:
+        """Index a directory tree, only listing directories that changed
+
+        Returns:
+            True if any directory in the tree was listed again, False otherwise.
+
+        """
+        try:
+            # Taken before listing so a change made while listing is seen next time
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return path in old
+        entry = old.get(path)
+        changed = False
+        if not entry or entry['mtime'] != mtime:
+            files, dirs = [], []
+            with os.scandir(path) as entries:
+                for e in entries:
+                    if e.is_dir(follow_symlinks=False):
+                        if e.name not in self.prune:
+                            dirs.append(e.name)
+                    else:
+                        files.append(e.name)
+            entry = {'mtime': mtime, 'files': sorted(files), 'dirs': sorted(dirs)}
+            changed = True
+        new[path] = entry
+        for dir in entry['dirs']:
+            changed |= self._scan(f'{path}/{dir}', old, new)
+        return changed
+
+    def find(self, root: str, names: List[str]) -> Optional[str]:
+        """Find a file by name anywhere under a directory
+
+        Args:
+            root:
+                The directory to search e.g. cenm-idman.
+            names:
+                The file names to look for, in order of preference within a directory.
+
+        Returns:
+            The path of the first file found, None if no file matches.
+
+        """
+        with self._lock:
+            old = IndexManager._index if IndexManager._index is not None else self._read()
+            new = {path: entry for path, entry in old.items() if not self._under(path, root)}
+            if self._scan(root, old, new):
+                self._write(new)
+            IndexManager._index = new
+        for path, entry in new.items():
+            if self._under(path, root):
+                for name in names:
+                    if name in entry['files']:
+                        return f'{path}/{name}'
+        return None
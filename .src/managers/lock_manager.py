@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import threading
+from time import time
+from typing import Dict, List, Optional
+from utils import SystemInteract, Constants
+
+class LockManager:
+    """Artifact lockfile manager.
+
+    The lockfile records, for every service artifact, the url and version
+    it was resolved to, its size and checksum and the files it was
+    installed as with their checksums. When a version in .env changes only the artifacts whose
+    coordinates changed are seen as stale, the files of the old version
+    are removed once the new version is installed and every other artifact
+    is left alone.
+
+    Args:
+        lock_file:
+            The path of the lockfile.
+
+    """
+    # The lockfile is shared by every service, writes are serialised across download workers
+    _write_lock = threading.Lock()
+
+    def __init__(self, lock_file: str = Constants.LOCK_FILE.value):
+        self.lock_file = lock_file
+        self.sysi = SystemInteract()
+
+    def _key(self, service) -> str:
+        return f'{service.dir}/{service.abb}'
+
+    def _read(self) -> Dict[str, Dict]:
+        try:
+            with open(self.lock_file, 'r') as f:
+                return json.load(f)['artifacts']
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return {}
+
+    def _write(self, artifacts: Dict[str, Dict]):
+        with open(f'{self.lock_file}.tmp', 'w') as f:
+            json.dump({'version': 1, 'artifacts': dict(sorted(artifacts.items()))}, f, indent=2)
+        os.replace(f'{self.lock_file}.tmp', self.lock_file)
+
+    def _sha256(self, path: str) -> str:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    def get(self, service) -> Optional[Dict]:
+        return self._read().get(self._key(service))
+
+    def is_stale(self, service) -> bool:
+        """Check if the installed artifact of a service was resolved to different coordinates
+
+        Returns:
+            True if the service has a lock entry for a different url, False otherwise.
+
+        """
+        entry = self.get(service)
+        return entry is not None and entry['url'] != service.url
+
+    def verify_files(self, service) -> Optional[List[str]]:
+        """Check the installed files of a service against the checksums recorded when it was installed
+
+        Returns:
+            The files missing or changed since, None if no checksums were recorded.
+
+        """
+        entry = self.get(service)
+        if not entry or 'files_sha256' not in entry:
+            return None
+        return [
+            file for file, checksum in entry['files_sha256'].items()
+            if not os.path.isfile(file) or self._sha256(file) != checksum
+        ]
+
+    def record(self, service, files: List[str], size: int = None, checksum: str = None):
+        """Record the installed artifact of a service
+
+        Files installed by a previous version that are not part of the new
+        version, and are not used by any other artifact, are removed.
+
+        Args:
+            service:
+                The service the artifact belongs to.
+            files:
+                The paths the artifact was installed as, relative to the repo root.
+            size:
+                The size of the downloaded artifact in bytes.
+            checksum:
+                The sha256 checksum of the downloaded artifact.
+
+        """
+        with self._write_lock:
+            artifacts = self._read()
+            old = artifacts.get(self._key(service))
+            if old and old['url'] != service.url:
+                in_use = set(files)
+                for key, entry in artifacts.items():
+                    if key != self._key(service):
+                        in_use.update(entry['files'])
+                for file in set(old['files']) - in_use:
+                    if os.path.lexists(file):
+                        os.remove(file)
+                print(f'Switched {service.artifact_name} in {service.dir} from {old["version"]} to {service.version}')
+            artifacts[self._key(service)] = {
+                'artifact': service.artifact_name,
+                'version': service.version,
+                'url': service.url,
+                'size': size,
+                'sha256': checksum,
+                'files': sorted(files),
+                'files_sha256': {file: self._sha256(file) for file in sorted(files) if os.path.isfile(file)},
+                'installed': time()
+            }
+            self._write(artifacts)
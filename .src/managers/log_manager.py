@@ -0,0 +1,160 @@
+import ctypes
+import ctypes.util
+import os
+import re
+import select
+from time import monotonic, sleep
+from typing import Dict, Optional, Tuple
+
+class _Inotify:
+    """Minimal inotify binding used to block until a log directory changes
+
+    """
+    IN_MODIFY = 0x002
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    def __init__(self, path: str):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        if libc.inotify_add_watch(self.fd, path.encode(), self.IN_MODIFY | self.IN_CREATE | self.IN_MOVED_TO) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {path}')
+
+    def wait(self, timeout: float) -> bool:
+        """Wait for a change, draining the pending events
+
+        Returns:
+            True if the directory changed, False if the timeout passed first.
+
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return False
+        try:
+            while os.read(self.fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+class LogTailer:
+    """Incremental log tailer firing readiness events.
+
+    Follows every log file in a directory from where it was when the tailer
+    was created, only reading what was appended since the last read, and
+    matches each new line against a readiness pattern. On Linux waiting
+    blocks on inotify until the directory changes, elsewhere the directory
+    is polled. Rotated or truncated files are read again from the start.
+
+    Args:
+        log_dir:
+            The directory holding the log files e.g. cenm-idman/logs.
+        pattern:
+            The regular expression matching the readiness line.
+        from_start:
+            If true, lines already in the log files are matched too.
+
+    """
+    POLL_INTERVAL = 0.25
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, log_dir: str, pattern: str, from_start: bool = False):
+        self.log_dir = log_dir
+        self.pattern = re.compile(pattern)
+        self.match = None
+        self.files: Dict[str, Tuple[int, int]] = {}
+        self.partial: Dict[str, bytes] = {}
+        self.inotify = None
+        if not from_start:
+            for path in self._log_files():
+                stat = os.stat(path)
+                self.files[path] = (stat.st_ino, stat.st_size)
+
+    def _log_files(self):
+        try:
+            with os.scandir(self.log_dir) as entries:
+                return [e.path for e in entries if e.name.endswith('.log') and e.is_file()]
+        except FileNotFoundError:
+            return []
+
+    def _read(self, path: str) -> Optional[str]:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        inode, offset = self.files.get(path, (stat.st_ino, 0))
+        if inode != stat.st_ino or stat.st_size < offset:
+            offset = 0
+            self.partial.pop(path, None)
+        if stat.st_size == offset:
+            return None
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b''):
+                offset += len(chunk)
+                lines = (self.partial.pop(path, b'') + chunk).split(b'\n')
+                self.partial[path] = lines.pop()
+                for line in lines:
+                    text = line.decode(errors='replace')
+                    if self.pattern.search(text):
+                        self.files[path] = (stat.st_ino, offset)
+                        return text
+        self.files[path] = (stat.st_ino, offset)
+        return None
+
+    def poll(self) -> Optional[str]:
+        """Read what was appended to the logs since the last poll
+
+        Returns:
+            The readiness line once it has been logged, None before.
+
+        """
+        if self.match is None:
+            for path in self._log_files():
+                self.match = self._read(path)
+                if self.match is not None:
+                    break
+        return self.match
+
+    def _block(self, timeout: float):
+        if self.inotify is None and os.path.isdir(self.log_dir):
+            try:
+                self.inotify = _Inotify(self.log_dir)
+            except (OSError, AttributeError, TypeError):
+                self.inotify = False
+        if self.inotify:
+            self.inotify.wait(timeout)
+        else:
+            sleep(min(timeout, self.POLL_INTERVAL))
+
+    def wait(self, timeout: float = None) -> Optional[str]:
+        """Wait for the readiness line to be logged
+
+        Args:
+            timeout:
+                The maximum time to wait in seconds, waits forever by default.
+
+        Returns:
+            The readiness line, None if the timeout passed first.
+
+        """
+        start = monotonic()
+        try:
+            while self.poll() is None:
+                remaining = None if timeout is None else timeout - (monotonic() - start)
+                if remaining is not None and remaining <= 0:
+                    return None
+                # Wake up regularly in case the log directory is replaced
+                self._block(1.0 if remaining is None else min(remaining, 1.0))
+            return self.match
+        finally:
+            if self.inotify:
+                self.inotify.close()
+            self.inotify = None
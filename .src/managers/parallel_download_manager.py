@@ -0,0 +1,118 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from time import time
+from typing import List, Dict, Tuple, Any
+from services.base_services import BaseService
+
+class DownloadProgress:
+    """Aggregated progress display for concurrent downloads.
+
+    Individual curl progress bars are disabled while downloading in
+    parallel, instead a single status line is printed every time an
+    artifact starts or finishes.
+
+    Args:
+        total:
+            The total number of artifacts to download.
+
+    """
+    def __init__(self, total: int):
+        self.total = total
+        self.completed = 0
+        self.failed = 0
+        self.running = []
+        self.lock = threading.Lock()
+
+    def _print_status(self, message: str):
+        running = ', '.join(self.running) if self.running else '-'
+        print(f'[{self.completed:>{len(str(self.total))}}/{self.total}] {message} (in progress: {running})', flush=True)
+
+    def start(self, name: str):
+        with self.lock:
+            self.running.append(name)
+            self._print_status(f'Started {name}')
+
+    def skip(self, name: str):
+        with self.lock:
+            self.completed += 1
+            self._print_status(f'Skipped {name}, already present')
+
+    def finish(self, name: str, error: bool, elapsed: float):
+        with self.lock:
+            self.running.remove(name)
+            self.completed += 1
+            if error:
+                self.failed += 1
+                self._print_status(f'Failed {name} after {elapsed:.1f}s')
+            else:
+                self._print_status(f'Finished {name} in {elapsed:.1f}s')
+
+class ParallelDownloadManager:
+    """Download manager for fetching service artifacts concurrently.
+
+    Repositories are cloned before any artifact is downloaded, as every
+    artifact is moved into its service directory once downloaded. Services
+    that share an artifact url (e.g. the corda jar used by both the notary
+    and the node) are grouped and handled by the same worker in order, so
+    the artifact is only fetched once and no two workers write the same
+    file in the repo root.
+
+    Args:
+        services:
+            A list of services to download artifacts for.
+        workers:
+            The maximum number of concurrent downloads.
+
+    """
+    def __init__(self, services: List[BaseService], workers: int = 4):
+        self.services = services
+        self.workers = workers
+
+    def _clone_repos(self):
+        repos = {}
+        for service in self.services:
+            repos.setdefault(service.dir, service)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for future in as_completed([executor.submit(service._clone_repo) for service in repos.values()]):
+                future.result()
+
+    def _group_by_url(self) -> List[List[BaseService]]:
+        groups = {}
+        for service in self.services:
+            groups.setdefault(service.url, []).append(service)
+        return list(groups.values())
+
+    def _download_group(self, group: List[BaseService], progress: DownloadProgress) -> Dict[Tuple[str, str], Any]:
+        download_errors = {}
+        for service in group:
+            name = service._zip_name()
+            if service.is_current():
+                progress.skip(name)
+                download_errors[(f'{service.artifact_name}-{service.version}', service.dir)] = None
+                continue
+            service.dlm.silent = True
+            progress.start(name)
+            start = time()
+            error = service.download()
+            progress.finish(name, bool(error), time() - start)
+            download_errors[(f'{service.artifact_name}-{service.version}', service.dir)] = error
+        return download_errors
+
+    def download(self) -> Dict[Tuple[str, str], Any]:
+        """Download all artifacts using a bounded pool of workers.
+
+        Returns:
+            A dictionary of download errors keyed by (artifact, directory).
+
+        """
+        self._clone_repos()
+        groups = self._group_by_url()
+        progress = DownloadProgress(len(self.services))
+        download_errors = {}
+        print(f'Downloading {len(self.services)} artifacts using {self.workers} workers')
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self._download_group, group, progress) for group in groups]
+            for future in as_completed(futures):
+                download_errors.update(future.result())
+        print(f'Downloads complete ({progress.failed} failed)')
+        return download_errors
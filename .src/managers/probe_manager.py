@@ -0,0 +1,198 @@
+import errno
+import selectors
+import socket
+import ssl
+from time import monotonic, sleep
+from typing import Dict, List
+from managers.trace_manager import TraceManager
+
+class Probe:
+    """Readiness probe for a service endpoint.
+
+    Args:
+        kind:
+            tcp (a connection is accepted), tls (the server answers a TLS
+            handshake) or http (the server answers an HTTP request).
+        port:
+            The port to probe.
+        host:
+            The host to probe, default is localhost.
+        path:
+            The path requested by http probes.
+
+    """
+    KINDS = ['tcp', 'tls', 'http']
+
+    def __init__(self, kind: str, port: int, host: str = 'localhost', path: str = '/'):
+        if kind not in self.KINDS:
+            raise ValueError(f'Unknown probe kind {kind}, expected one of {", ".join(self.KINDS)}')
+        self.kind = kind
+        self.port = port
+        self.host = host
+        self.path = path
+
+    def __str__(self) -> str:
+        return f'{self.kind}://{self.host}:{self.port}'
+
+    def __repr__(self):
+        return self.__str__()
+
+class ProbeManager:
+    """Selector based readiness probes.
+
+    Every probe of a round is connected without blocking and driven by a
+    single selector loop, so any number of endpoints are checked at the
+    same time by one thread. Probes that aren't ready are retried at sub
+    second intervals with backoff, a probe is ready as soon as its
+    endpoint answers. Every address the host resolves to is tried at once,
+    e.g. localhost as both ::1 and 127.0.0.1, the first to answer counts.
+
+    Args:
+        timeout:
+            The time a single round waits for endpoints to answer, in seconds.
+        interval:
+            The initial time between rounds, in seconds.
+        max_interval:
+            The maximum time between rounds, in seconds.
+
+    """
+    def __init__(self, timeout: float = 2.0, interval: float = 0.1, max_interval: float = 2.0):
+        self.timeout = timeout
+        self.interval = interval
+        self.max_interval = max_interval
+        self.tls_context = ssl.create_default_context()
+        # Only the handshake is checked, the CENM services use their own development PKI
+        self.tls_context.check_hostname = False
+        self.tls_context.verify_mode = ssl.CERT_NONE
+
+    def _connect(self, probe: Probe) -> List[socket.socket]:
+        """Start connecting to every address of the probe host
+
+        """
+        sockets = []
+        for family, type, proto, _, address in socket.getaddrinfo(probe.host, probe.port, type=socket.SOCK_STREAM):
+            sock = socket.socket(family, type, proto)
+            sock.setblocking(False)
+            err = sock.connect_ex(address)
+            if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+                sock.close()
+                continue
+            sockets.append(sock)
+        return sockets
+
+    def _handshake(self, sock: ssl.SSLSocket):
+        """Advance a TLS handshake
+
+        Returns:
+            The selector event to wait for, None once the server answered.
+
+        """
+        try:
+            sock.do_handshake()
+        except ssl.SSLWantReadError:
+            return selectors.EVENT_READ
+        except ssl.SSLWantWriteError:
+            return selectors.EVENT_WRITE
+        except ssl.SSLEOFError:
+            raise ConnectionResetError()
+        except ssl.SSLError:
+            # The server answered with a TLS alert e.g. because it requires a client certificate
+            pass
+        return None
+
+    def _advance(self, probe: Probe, state: str, sock: socket.socket):
+        """Move a probe to its next state
+
+        Returns:
+            The next state, the socket and the selector event to wait for,
+            the state is ready once the endpoint answered.
+
+        """
+        if state == 'connect':
+            err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if err:
+                raise ConnectionRefusedError(err, probe)
+            if probe.kind == 'tcp':
+                return 'ready', sock, None
+            if probe.kind == 'tls':
+                sock = self.tls_context.wrap_socket(sock, do_handshake_on_connect=False)
+                state = 'handshake'
+            else:
+                sock.send(f'GET {probe.path} HTTP/1.1\r\nHost: {probe.host}\r\nConnection: close\r\n\r\n'.encode())
+                return 'response', sock, selectors.EVENT_READ
+        if state == 'handshake':
+            event = self._handshake(sock)
+            return ('handshake', sock, event) if event else ('ready', sock, None)
+        if state == 'response':
+            if sock.recv(5) == b'HTTP/':
+                return 'ready', sock, None
+            raise ConnectionResetError()
+
+    def check(self, probes: List[Probe]) -> Dict[Probe, bool]:
+        """Run every probe once, concurrently
+
+        Args:
+            probes:
+                The probes to run.
+
+        Returns:
+            A dictionary of whether each probe is ready, keyed by probe.
+
+        """
+        results = {probe: False for probe in probes}
+        with selectors.DefaultSelector() as selector:
+            for probe in probes:
+                try:
+                    for sock in self._connect(probe):
+                        selector.register(sock, selectors.EVENT_WRITE, (probe, 'connect'))
+                except OSError:
+                    pass
+            deadline = monotonic() + self.timeout
+            while selector.get_map() and monotonic() < deadline:
+                for key, _ in selector.select(deadline - monotonic()):
+                    probe, state = key.data
+                    selector.unregister(key.fileobj)
+                    if results[probe]:
+                        # Another address of the host already answered
+                        key.fileobj.close()
+                        continue
+                    try:
+                        state, sock, event = self._advance(probe, state, key.fileobj)
+                    except OSError:
+                        key.fileobj.close()
+                        continue
+                    if state == 'ready':
+                        results[probe] = True
+                        sock.close()
+                    else:
+                        selector.register(sock, event, (probe, state))
+            for key in list(selector.get_map().values()):
+                key.fileobj.close()
+        return results
+
+    def wait(self, probes: List[Probe], timeout: float = None) -> bool:
+        """Wait for every probe to be ready
+
+        Args:
+            probes:
+                The probes to wait for.
+            timeout:
+                The maximum time to wait in seconds, waits forever by default.
+
+        Returns:
+            True once every probe is ready, False if the timeout passed first.
+
+        """
+        start = monotonic()
+        interval = self.interval
+        pending = list(probes)
+        with TraceManager.span('ProbeManager.wait', probes=', '.join(str(probe) for probe in probes)):
+            while True:
+                results = self.check(pending)
+                pending = [probe for probe in pending if not results[probe]]
+                if not pending:
+                    return True
+                if timeout is not None and monotonic() - start >= timeout:
+                    return False
+                sleep(interval if timeout is None else min(interval, max(timeout - (monotonic() - start), 0)))
+                interval = min(interval * 1.5, self.max_interval)
@@ -0,0 +1,145 @@
+import csv
+import json
+import os
+import subprocess
+import threading
+from collections import deque
+from time import monotonic, time
+from typing import Deque, Dict, List, Tuple
+
+class ResourceManager:
+    """Resource sampler for the service JVMs.
+
+    Samples the CPU use, resident memory, thread count and open file
+    descriptors of every service from /proc at a fixed interval, counting
+    the processes a service started (e.g. the services run by the angels)
+    towards it. Each service keeps its samples in a ring buffer, so memory
+    use stays bounded however long the deployment runs.
+
+    Args:
+        processes:
+            The processes to sample keyed by service name, read on every
+            sample so restarted services are followed.
+        interval:
+            The time between samples, in seconds.
+        capacity:
+            The number of samples kept per service.
+
+    """
+    FIELDS = ['time', 'cpu_percent', 'rss_mb', 'threads', 'fds']
+
+    def __init__(self, processes: Dict[str, subprocess.Popen], interval: float = 5, capacity: int = 720):
+        self.processes = processes
+        self.interval = interval
+        self.capacity = capacity
+        self.samples: Dict[str, Deque[Tuple]] = {}
+        self.cpu_times: Dict[int, Tuple[float, float]] = {}
+        self.stopped = threading.Event()
+
+    def available(self) -> bool:
+        return os.path.exists('/proc/self/stat')
+
+    def _tree(self, pid: int) -> List[int]:
+        """Get a process and every process it started, from the children of each of its threads
+
+        """
+        pids = [pid]
+        for parent in pids:
+            try:
+                for tid in os.listdir(f'/proc/{parent}/task'):
+                    with open(f'/proc/{parent}/task/{tid}/children', 'r') as f:
+                        pids.extend(int(child) for child in f.read().split())
+            except OSError:
+                pass
+        return pids
+
+    def _read(self, pid: int) -> Tuple[float, int, int, int]:
+        """Read the usage of a process
+
+        Returns:
+            The CPU seconds used, the resident memory in bytes, the number of threads and of open file descriptors.
+
+        """
+        with open(f'/proc/{pid}/stat', 'r') as f:
+            # The command name can hold spaces, the fields after it start with the state
+            fields = f.read().rsplit(')', 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        return cpu, int(fields[21]) * os.sysconf('SC_PAGE_SIZE'), int(fields[17]), len(os.listdir(f'/proc/{pid}/fd'))
+
+    def sample(self):
+        now = monotonic()
+        for name, process in list(self.processes.items()):
+            if process.poll() is not None:
+                continue
+            cpu = rss = threads = fds = 0
+            for pid in self._tree(process.pid):
+                try:
+                    usage = self._read(pid)
+                except (OSError, IndexError, ValueError):
+                    continue
+                cpu, rss, threads, fds = cpu + usage[0], rss + usage[1], threads + usage[2], fds + usage[3]
+            last = self.cpu_times.get(process.pid)
+            self.cpu_times[process.pid] = (cpu, now)
+            cpu_percent = round(100 * (cpu - last[0]) / (now - last[1]), 1) if last and now > last[1] else None
+            samples = self.samples.setdefault(name, deque(maxlen=self.capacity))
+            samples.append((round(time(), 1), cpu_percent, round(rss / 1024 ** 2, 1), threads, fds))
+
+    def start(self):
+        """Sample on a background thread until stopped
+
+        """
+        def _sample():
+            while not self.stopped.wait(self.interval):
+                self.sample()
+        threading.Thread(target=_sample, name='resources', daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def summary(self) -> Dict[str, Dict]:
+        """Get the average and peak usage of every service
+
+        Returns:
+            The number of samples, average and peak CPU and memory, peak threads and file descriptors, keyed by service name.
+
+        """
+        summary = {}
+        for name, samples in self.samples.items():
+            cpu = [sample[1] for sample in samples if sample[1] is not None]
+            rss = [sample[2] for sample in samples]
+            summary[name] = {
+                'samples': len(samples),
+                'cpu_avg': sum(cpu) / len(cpu) if cpu else 0,
+                'cpu_peak': max(cpu, default=0),
+                'rss_avg': sum(rss) / len(rss),
+                'rss_peak': max(rss),
+                'threads_peak': max(sample[3] for sample in samples),
+                'fds_peak': max(sample[4] for sample in samples)
+            }
+        return summary
+
+    def log_summary(self, logger):
+        for name, usage in self.summary().items():
+            logger.info(
+                f'{name}: cpu {usage["cpu_avg"]:.1f}% avg {usage["cpu_peak"]:.1f}% peak, '
+                f'rss {usage["rss_avg"]:.0f} MB avg {usage["rss_peak"]:.0f} MB peak, '
+                f'{usage["threads_peak"]} threads and {usage["fds_peak"]} fds peak over {usage["samples"]} samples'
+            )
+
+    def dump(self, path: str):
+        """Write every sample kept to a CSV file, or a JSON file if the path ends with .json
+
+        """
+        if path.endswith('.json'):
+            with open(path, 'w') as f:
+                json.dump({
+                    'interval': self.interval,
+                    'fields': self.FIELDS,
+                    'services': {name: [list(sample) for sample in samples] for name, samples in self.samples.items()}
+                }, f, separators=(',', ':'))
+            return
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['service', *self.FIELDS])
+            for name, samples in self.samples.items():
+                writer.writerows([name, *sample] for sample in samples)
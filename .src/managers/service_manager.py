@@ -1,11 +1,18 @@
 from services.services import *
+from managers.cds_manager import CdsManager
 from managers.config_manager import ConfigManager
 from managers.database_manager import DatabaseManager
 from managers.download_manager import DownloadManager
 from managers.deployment_manager import DeploymentManager
+from managers.parallel_download_manager import ParallelDownloadManager
+from managers.probe_manager import Probe
+from managers.snapshot_manager import SnapshotManager
+from managers.state_manager import StateManager
+from managers.timings_manager import TimingsManager
 from managers.node_manager import NodeManager
 from utils import *
 from typing import List, Dict, Tuple, Any
+from time import time
 
 class ServiceError(Exception):
     def __init__(self, service, dir):
@@ -13,6 +20,12 @@ class ServiceError(Exception):
 {} artifact not found in {} directory, please try and download agian.
         """.format(service, dir))
 
+class IntegrityError(Exception):
+    def __init__(self, service, dir):
+        super().__init__("""
+{} artifact in {} directory does not match its published checksum, please clean and download again.
+        """.format(service, dir))
+
 class ServiceManager:
     """A manager to manage operations on all CENM services including:
         
@@ -85,6 +98,8 @@ class ServiceManager:
             config_file=    'auth.conf',
             deployment_time=self.deploy_time.AUTH_DEPLOY_TIME.value,
             certificates=   2,
+            depends_on=     [],
+            ready_probes=   [Probe('tls', 8081)],
             java_version=   self.cenm_java_version)
         self.CLIENT = AuthClientService(
             abb=            'client',
@@ -116,6 +131,8 @@ class ServiceManager:
             config_file=    'gateway.conf',
             deployment_time=self.deploy_time.GATEWAY_DEPLOY_TIME.value,
             certificates=   4,
+            depends_on=     [],
+            ready_probes=   [Probe('http', 8089)],
             java_version=   self.cenm_java_version)
         self.GATEWAY_PLUGIN = GatewayPluginService(
             abb=            'gateway-plugin',
@@ -147,6 +164,9 @@ class ServiceManager:
             config_file=    'identitymanager-init.conf',
             deployment_time=self.deploy_time.IDMAN_DEPLOY_TIME.value,
             certificates=   3,
+            depends_on=     [],
+            ready_probes=   [Probe('http', 10000), Probe('tls', 5053)],
+            ready_log=      r'(?i)identity manager.*\bstarted',
             java_version=   self.cenm_java_version)
         self.IDMAN_ANGEL = IdentityManagerAngelService(
             abb=            'idman-angel',
@@ -160,6 +180,9 @@ class ServiceManager:
             config_file=    'identitymanager-init.conf',
             deployment_time=self.deploy_time.ANGEL_DEPLOY_TIME.value,
             certificates=   3,
+            depends_on=     ['zone'],
+            ready_probes=   [Probe('http', 10000), Probe('tls', 5053)],
+            ready_log=      r'(?i)identity manager.*\bstarted',
             java_version=   self.cenm_java_version)
         self.CRR_TOOL = CrrToolService(
             abb=            'crr-tool',
@@ -182,6 +205,9 @@ class ServiceManager:
             config_file=    'networkmap-init.conf',
             deployment_time=self.deploy_time.NMAP_DEPLOY_TIME.value,
             certificates=   4,
+            depends_on=     ['notary'],
+            ready_probes=   [Probe('http', 20000), Probe('tls', 5055)],
+            ready_log=      r'(?i)network map.*\bstarted',
             java_version=   self.cenm_java_version)
         self.NMAP_ANGEL = NetworkMapAngelService(
             abb=            'nmap-angel',
@@ -195,6 +221,9 @@ class ServiceManager:
             config_file=    'networkmap-init.conf',
             deployment_time=self.deploy_time.ANGEL_DEPLOY_TIME.value,
             certificates=   4,
+            depends_on=     ['zone', 'notary'],
+            ready_probes=   [Probe('http', 20000), Probe('tls', 5055)],
+            ready_log=      r'(?i)network map.*\bstarted',
             java_version=   self.cenm_java_version)
         self.NOTARY = NotaryService(
             abb=            'notary',
@@ -208,6 +237,7 @@ class ServiceManager:
             config_file=    'notary.conf',
             deployment_time=self.deploy_time.NOTARY_DEPLOY_TIME.value,
             certificates=   1,
+            depends_on=     ['idman'],
             java_version=   self.corda_java_version)
         self.NODE = NodeService(
             abb=            'node',
@@ -221,6 +251,8 @@ class ServiceManager:
             config_file=    'node.conf',
             deployment_time=self.deploy_time.NODE_DEPLOY_TIME.value,
             certificates=   1,
+            depends_on=     ['idman'],
+            ready_log=      'started up and registered in',
             java_version=   self.corda_java_version)
         self.NODE_HA_TOOLS = CordaToolsHaUtilitiesService(
             abb=            'ha-utuilities',
@@ -285,6 +317,9 @@ class ServiceManager:
             config_file=    'signer.conf',
             deployment_time=self.deploy_time.SIGNER_DEPLOY_TIME.value,
             certificates=   6,
+            depends_on=     ['idman'],
+            ready_probes=   [Probe('tls', 5054)],
+            ready_log=      r'(?i)signing service.*\bstarted',
             java_version=   self.cenm_java_version)
         self.SIGNER_CA_PLUGIN = SignerPluginCAService(
             abb=            'signer-ca-plugin',
@@ -316,6 +351,8 @@ class ServiceManager:
             config_file=    '',
             deployment_time=self.deploy_time.ZONE_DEPLOY_TIME.value,
             certificates=   2,
+            depends_on=     ['auth'],
+            ready_probes=   [Probe('tls', 5061), Probe('tcp', 5063)],
             java_version=   self.cenm_java_version)
 
         self.db_manager = DatabaseManager(self.get_database_services(), DownloadManager(username, password))
@@ -417,12 +454,9 @@ class ServiceManager:
             print("There were service that were not found, check the logs")
             raise ExceptionGroup("Combined service exceptions", exceptions)
 
-    def download_all(self):
+    def download_all(self, download_workers: int = 4):
         # deprecated
-        download_errors = {}
-        for service in self._get_all_services():
-            # deprecated
-            download_errors[(f'{service.artifact_name}-{service.version}', service.dir)] = service.download()
+        download_errors = ParallelDownloadManager(self._get_all_services(), download_workers).download()
         # this returns true or false depending on download error but return is not used
         self.db_manager.download()
         self.check_all()
@@ -431,7 +465,7 @@ class ServiceManager:
         check_errors = {}
         print("Validating services")
         for service in self._get_all_services():
-            if (not service._check_presence()):
+            if (not service.is_current()):
                 check_errors[(f'{service.artifact_name}-{service.version}', service.dir)] = service.dir
                 print(u'[\u274c] ' + f'{service.dir}/{service.artifact_name}-{service.version}')
             else:
@@ -439,6 +473,62 @@ class ServiceManager:
         self._raise_exception_group(check_errors)
         print("Validating complete")
 
+    def set_download_backend(self, backend: str):
+        for service in self._get_all_services():
+            service.dlm.backend = backend
+        self.db_manager.dlm.backend = backend
+
+    def set_cds(self, enabled: bool):
+        CdsManager.enabled = enabled
+
+    def set_jvm_profile(self, profile: str):
+        for service in self._get_all_services():
+            if isinstance(service, DeploymentService):
+                service.jvm_profile = profile
+
+    def check_integrity(self):
+        integrity_errors = []
+        print("Validating artifact checksums")
+        for service in self._get_all_services():
+            verified = service.validate_artifact()
+            if verified is None:
+                print(u'[\u2753] ' + f'{service.dir}/{service.artifact_name}-{service.version} (no checksum to compare)')
+            elif verified:
+                print(u'[\u2705] ' + f'{service.dir}/{service.artifact_name}-{service.version}')
+            else:
+                integrity_errors.append(IntegrityError(f'{service.artifact_name}-{service.version}', service.dir))
+                print(u'[\u274c] ' + f'{service.dir}/{service.artifact_name}-{service.version}')
+        if integrity_errors:
+            print("There were artifacts that failed checksum validation")
+            raise ExceptionGroup("Combined integrity exceptions", integrity_errors)
+        print("Checksum validation complete")
+
+    def switch_versions(self):
+        """Switch every service to the versions in .env using only locally stored artifacts
+
+        """
+        print("Switching artifact versions")
+        start = time()
+        missing = []
+        for service in self._get_all_services():
+            if service.switch_version():
+                print(u'[\u2705] ' + f'{service.dir}/{service.artifact_name}-{service.version}')
+            else:
+                missing.append(service)
+                print(u'[\u274c] ' + f'{service.dir}/{service.artifact_name}-{service.version} (not stored locally)')
+        print(f'Switching complete in {time() - start:.2f}s')
+        if missing:
+            stored = missing[0].store.versions()
+            for service in missing:
+                versions = ', '.join(stored.get(f'{service.dir}/{service.abb}', [])) or 'none'
+                print(f'Stored versions of {service.dir}/{service.artifact_name}: {versions}')
+            print("Run --setup-dir-structure to download the missing artifacts")
+
+    def validate(self):
+        self.db_manager.dlm.cache.print_stats()
+        self.check_all()
+        self.check_integrity()
+
     def download_specific(self, services: List[str]):
         print("Downloading individual artifacts does not work with any other arguments, script will exit after downloading.")
         # deprecated
@@ -454,17 +544,22 @@ class ServiceManager:
                 download_errors[service] = str(e)
         self.check_all()
 
-    def deploy_all(self, health_check_frequency: int):
+    def deploy_all(self, health_check_frequency: int, sample_interval: int = 5, samples_file: str = None, trace_file: str = None):
         self.check_all()
         self.config_manager.validate(self.get_deployment_services(deploy_without_angel=self.deploy_without_angel))
         self.PKI.validate_certificates(self.get_deployment_services(pure_cenm=True, deploy_without_angel=self.deploy_without_angel))
-        self.deployment_manager.deploy_services(health_check_frequency)
+        if self.node_count:
+            node_manager = self._get_node_manager()
+            self.config_manager.validate(node_manager.new_nodes)
+            self.PKI.validate_certificates(node_manager.new_nodes)
+            self.deployment_manager.add_services(node_manager.new_nodes)
+        self.deployment_manager.deploy_services(health_check_frequency, sample_interval, samples_file, trace_file)
 
-    def deploy_nodes(self, health_check_frequency: int):
+    def deploy_nodes(self, health_check_frequency: int, sample_interval: int = 5, samples_file: str = None, trace_file: str = None):
         node_manager = self._get_node_manager()
         self.config_manager.validate(node_manager.new_nodes)
         self.PKI.validate_certificates(node_manager.new_nodes)
-        node_manager.deploy_nodes(health_check_frequency)
+        node_manager.deploy_nodes(health_check_frequency, sample_interval, samples_file, trace_file)
 
     def generate_certificates(self):
         self.check_all()
@@ -511,5 +606,43 @@ class ServiceManager:
             except ValueError as e:
                 print(e)
 
+    def timings(self):
+        TimingsManager().print_report()
+
+    def _running_states(self, service: str) -> List[StateManager]:
+        """Get the running deployments, only the one running the service if one is given
+
+        """
+        running = [state for state in StateManager.all() if state.running()]
+        if service == 'all':
+            return running
+        return [state for state in running if service in state.running()['services']][:1]
+
+    def status(self):
+        running = [state for state in StateManager.all() if state.running()]
+        for state in running or [StateManager()]:
+            state.print_status()
+
+    def stop(self, service: str):
+        # Nodes deployed against the CENM deployment are stopped first
+        states = self._running_states(service)[::-1]
+        if not states:
+            print('No deployment is running' if service == 'all' else f'No running deployment has a service {service}')
+        for state in states:
+            print(state.stop(None if service == 'all' else service))
+
+    def restart(self, service: str):
+        states = self._running_states(service)
+        if not states:
+            print('No deployment is running' if service == 'all' else f'No running deployment has a service {service}')
+        for state in states:
+            print(state.restart(None if service == 'all' else service))
+
+    def snapshot(self, name: str):
+        SnapshotManager().snapshot(name)
+
+    def restore(self, name: str):
+        SnapshotManager().restore(name)
+
     def versions(self):
         return self.printer.print_cenm_version()
@@ -0,0 +1,226 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+from typing import Dict, List
+from managers.state_manager import StateManager
+from utils import Constants
+
+class SnapshotError(Exception):
+    pass
+
+class SnapshotManager:
+    """Snapshots of the runtime state of a bootstrapped network.
+
+    A snapshot holds every file of the service directories except the
+    downloaded artifacts and the logs: the h2 databases, node infos,
+    tokens, network parameters, certificates, the auth roles rewritten
+    with the subzone and the configs written by the angels. Restoring it
+    brings back a network that has already been bootstrapped, so the next
+    deployment skips certificate generation, registration and the subzone
+    setup.
+
+    Files are stored once by their sha256 checksum, compressed, under
+    ``blobs/`` and every snapshot is a manifest of paths to checksums, so
+    files shared by snapshots, like certificates and unchanged configs,
+    are only stored once. Restoring only writes the files that differ from
+    what is on disk.
+
+    Args:
+        snapshot_dir:
+            The directory holding the snapshots.
+        workers:
+            The number of files hashed and compressed in parallel.
+
+    """
+    ARTIFACTS = ('.jar', '.zip', '.jsa', '.jsa.sha256', '.tmp')
+    # The service directories are git checkouts, restoring their git internals could move them to another commit
+    EXCLUDED_DIRS = ['logs', '.git']
+    CHUNK_SIZE = 1024 * 1024
+    NAME = re.compile(r'^[\w.-]+$')
+
+    def __init__(self, snapshot_dir: str = Constants.SNAPSHOT_DIR.value, workers: int = None):
+        self.snapshot_dir = snapshot_dir
+        self.blob_dir = os.path.join(snapshot_dir, 'blobs')
+        self.workers = workers or min(os.cpu_count() or 1, 8)
+        self.runtime_files = Constants.RUNTIME_FILES.value
+        self.states = StateManager.all()
+
+    def _manifest_file(self, name: str) -> str:
+        if not self.NAME.match(name):
+            raise SnapshotError(f'Invalid snapshot name {name}, use letters, digits, dots, dashes and underscores')
+        return os.path.join(self.snapshot_dir, f'{name}.json')
+
+    def _blob(self, checksum: str) -> str:
+        return os.path.join(self.blob_dir, checksum)
+
+    def _sha256(self, path: str) -> str:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b''):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    def _files(self) -> List[str]:
+        """Get the runtime state files of every service directory
+
+        """
+        files = []
+        for service_dir in sorted(glob.glob('cenm-*/')):
+            if os.path.abspath(service_dir) == os.path.abspath(self.snapshot_dir):
+                continue
+            for root, dirs, names in os.walk(service_dir):
+                dirs[:] = sorted(dir for dir in dirs if dir not in self.EXCLUDED_DIRS)
+                for name in sorted(names):
+                    path = os.path.join(root, name)
+                    if name.endswith(self.ARTIFACTS) or name in ['cenm', 'cenm.cmd'] or os.path.islink(path):
+                        continue
+                    files.append(os.path.normpath(path))
+        return files
+
+    def _is_runtime(self, path: str) -> bool:
+        """Check if a file is generated while bootstrapping, so it is removed on restore if not in the snapshot
+
+        """
+        name = os.path.basename(path)
+        return (
+            any(dir in self.runtime_files['dirs'] for dir in path.split(os.sep)[:-1])
+            or name.startswith('nodeInfo')
+            or name in self.runtime_files['notary_files']
+            or name in self.runtime_files['angel_files']
+            or name.endswith(('.jks', '.crl'))
+        )
+
+    def _versions(self) -> Dict[str, str]:
+        with open('.env', 'r') as f:
+            variables = [line.strip().partition('=') for line in f.readlines() if '=' in line]
+        # Only the versions, the same file holds the artifactory credentials
+        return {key: value for (key, _, value) in variables if key.endswith('_VERSION')}
+
+    def _check_stopped(self):
+        for state in filter(None, [state.running() for state in self.states]):
+            raise SnapshotError(f'A deployment is running (supervisor pid {state["pid"]}), stop it with --stop first')
+
+    def _store(self, path: str) -> Dict:
+        checksum = self._sha256(path)
+        stat = os.stat(path)
+        blob = self._blob(checksum)
+        stored = 0
+        if not os.path.exists(blob):
+            compressor = zlib.compressobj(6)
+            tmp_file = f'{blob}.{os.getpid()}.{os.urandom(4).hex()}.tmp'
+            with open(path, 'rb') as source, open(tmp_file, 'wb') as f:
+                for chunk in iter(lambda: source.read(self.CHUNK_SIZE), b''):
+                    f.write(compressor.compress(chunk))
+                f.write(compressor.flush())
+            stored = os.path.getsize(tmp_file)
+            os.replace(tmp_file, blob)
+        return {'sha256': checksum, 'size': stat.st_size, 'mode': stat.st_mode & 0o777, 'stored': stored}
+
+    def snapshot(self, name: str) -> Dict:
+        """Take a snapshot of the runtime state of the stopped network
+
+        Args:
+            name:
+                The name of the snapshot, an existing snapshot of the same name is replaced.
+
+        Returns:
+            The manifest of the snapshot.
+
+        """
+        manifest_file = self._manifest_file(name)
+        self._check_stopped()
+        if not (glob.glob('cenm-nmap/nodeInfo-*') and glob.glob('cenm-notary/nodeInfo-*')):
+            raise SnapshotError('The network has not been bootstrapped yet, run --run-default-deployment until every service is ready first')
+        start = time()
+        os.makedirs(self.blob_dir, exist_ok=True)
+        paths = self._files()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            entries = dict(zip(paths, executor.map(self._store, paths)))
+        stored = sum(entry.pop('stored') for entry in entries.values())
+        manifest = {
+            'version': 1,
+            'name': name,
+            'created': time(),
+            'versions': self._versions(),
+            'size': sum(entry['size'] for entry in entries.values()),
+            'files': entries
+        }
+        tmp_file = f'{manifest_file}.{os.getpid()}.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_file, manifest_file)
+        print(f'Snapshot {name}: {len(entries)} files, {manifest["size"] / 1024 ** 2:.1f} MB, '
+            f'{stored / 1024 ** 2:.1f} MB newly stored in {time() - start:.1f}s')
+        return manifest
+
+    def _read(self, name: str) -> Dict:
+        try:
+            with open(self._manifest_file(name), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            available = ', '.join(self.snapshots()) or 'none'
+            raise SnapshotError(f'No snapshot named {name}, available snapshots: {available}')
+
+    def _restore(self, path: str, entry: Dict) -> bool:
+        """Write a file of a snapshot unless it is already on disk
+
+        Returns:
+            True if the file was written.
+
+        """
+        if os.path.isfile(path) and os.path.getsize(path) == entry['size'] and self._sha256(path) == entry['sha256']:
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        decompressor = zlib.decompressobj()
+        tmp_file = f'{path}.{os.getpid()}.tmp'
+        with open(self._blob(entry['sha256']), 'rb') as blob, open(tmp_file, 'wb') as f:
+            for chunk in iter(lambda: blob.read(self.CHUNK_SIZE), b''):
+                f.write(decompressor.decompress(chunk))
+            f.write(decompressor.flush())
+        os.chmod(tmp_file, entry['mode'])
+        os.replace(tmp_file, path)
+        return True
+
+    def restore(self, name: str) -> int:
+        """Restore the runtime state of a snapshot
+
+        Files generated while bootstrapping that are not in the snapshot,
+        e.g. the databases of nodes added later, are removed so the
+        network is exactly as it was when the snapshot was taken.
+
+        Args:
+            name:
+                The name of the snapshot.
+
+        Returns:
+            The number of files written.
+
+        """
+        manifest = self._read(name)
+        self._check_stopped()
+        missing = [path for path, entry in manifest['files'].items() if not os.path.exists(self._blob(entry['sha256']))]
+        if missing:
+            raise SnapshotError(f'Snapshot {name} is incomplete, {len(missing)} files are missing from {self.blob_dir}')
+        versions = self._versions()
+        changed = [key for key, value in manifest['versions'].items() if versions.get(key) != value]
+        if changed:
+            print(f'Warning: snapshot {name} was taken with other versions of {", ".join(changed)}')
+        start = time()
+        removed = [path for path in self._files() if path not in manifest['files'] and self._is_runtime(path)]
+        for path in removed:
+            os.remove(path)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            written = sum(executor.map(lambda item: self._restore(*item), manifest['files'].items()))
+        print(f'Restored snapshot {name}: {written} of {len(manifest["files"])} files written, '
+            f'{len(removed)} removed in {time() - start:.1f}s')
+        return written
+
+    def snapshots(self) -> List[str]:
+        if not os.path.isdir(self.snapshot_dir):
+            return []
+        return sorted(file[:-len('.json')] for file in os.listdir(self.snapshot_dir) if file.endswith('.json'))
@@ -0,0 +1,192 @@
+import json
+import os
+import signal
+import socket
+import threading
+from time import monotonic, sleep, time
+from typing import Callable, Dict, List, Optional
+from utils import Constants
+
+class StateManager:
+    """Runtime state of a running deployment.
+
+    The supervisor of a running deployment keeps the state of every
+    service, its pid, ports, start time, restart count and readiness, in a
+    state file and listens for commands on a unix socket next to it. Other
+    shells read the state file to see what is running and send stop and
+    restart commands over the socket, neither needs to look at ps. Nodes
+    deployed against an already running CENM deployment keep their state
+    apart from it, see [nodes].
+
+    Args:
+        state_file:
+            The path of the state file.
+        control_file:
+            The path of the control socket.
+
+    """
+    _write_lock = threading.Lock()
+
+    def __init__(self, state_file: str = Constants.STATE_FILE.value, control_file: str = Constants.CONTROL_FILE.value):
+        self.state_file = state_file
+        self.control_file = control_file
+
+    @classmethod
+    def nodes(cls) -> 'StateManager':
+        """The state of a node deployment run against an already running CENM deployment
+
+        """
+        return cls(Constants.NODES_STATE_FILE.value, Constants.NODES_CONTROL_FILE.value)
+
+    @classmethod
+    def all(cls) -> List['StateManager']:
+        return [cls(), cls.nodes()]
+
+    def read(self) -> Optional[Dict]:
+        try:
+            with open(self.state_file, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def write(self, services: Dict[str, Dict]):
+        """Write the state of every service of this deployment
+
+        Args:
+            services:
+                The state of each service, keyed by service name.
+
+        """
+        with self._write_lock:
+            tmp_file = f'{self.state_file}.{os.getpid()}.tmp'
+            with open(tmp_file, 'w') as f:
+                json.dump({'version': 1, 'pid': os.getpid(), 'updated': time(), 'services': services}, f, indent=2)
+            os.replace(tmp_file, self.state_file)
+
+    def running(self) -> Optional[Dict]:
+        """Get the state of the running deployment
+
+        Returns:
+            The state, None if no deployment is running.
+
+        """
+        state = self.read()
+        if not state:
+            return None
+        try:
+            os.kill(state['pid'], 0)
+        except ProcessLookupError:
+            return None
+        except PermissionError:
+            pass
+        return state
+
+    def serve(self, handler: Callable[[str, Optional[str]], str]):
+        """Answer commands sent to the control socket on a background thread
+
+        Args:
+            handler:
+                Called with the command and service name of every request, returns the reply.
+
+        Raises:
+            RuntimeError: if another deployment is running with the same state file.
+
+        """
+        state = self.running()
+        if state and state['pid'] != os.getpid():
+            raise RuntimeError(f'A deployment is already running (supervisor pid {state["pid"]}) with state file {self.state_file}')
+        if os.path.exists(self.control_file):
+            os.remove(self.control_file)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.control_file)
+        server.listen()
+
+        def _serve():
+            while True:
+                conn, _ = server.accept()
+                with conn, conn.makefile('rw') as f:
+                    command, _, name = f.readline().strip().partition(' ')
+                    try:
+                        reply = handler(command, name or None)
+                    except Exception as e:
+                        reply = f'{command} failed: {e}'
+                    f.write(f'{reply}\n')
+        threading.Thread(target=_serve, name='control', daemon=True).start()
+
+    def send(self, command: str, name: str = None) -> str:
+        """Send a command to the running deployment
+
+        Returns:
+            The reply of the deployment.
+
+        """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(self.control_file)
+            with client.makefile('rw') as f:
+                f.write(f'{command} {name or ""}\n')
+                f.flush()
+                return f.readline().strip()
+
+    def stop(self, name: str = None, timeout: float = 60) -> str:
+        """Stop a service of the running deployment, or the whole deployment
+
+        Args:
+            name:
+                The service to stop, stops the deployment by default.
+            timeout:
+                The maximum time to wait for the deployment to stop, in seconds.
+
+        Returns:
+            The outcome.
+
+        """
+        state = self.running()
+        if not state:
+            return 'No deployment is running'
+        if name:
+            return self.send('stop', name)
+        # Stopped the same way as with Ctrl+C in the shell running it
+        os.kill(state['pid'], signal.SIGINT)
+        deadline = monotonic() + timeout
+        while monotonic() < deadline:
+            if not self.running():
+                return 'Deployment stopped'
+            sleep(0.1)
+        return f'Deployment (pid {state["pid"]}) still stopping after {timeout:g} seconds'
+
+    def restart(self, name: str = None) -> str:
+        """Restart a service of the running deployment, or every service
+
+        Returns:
+            The outcome.
+
+        """
+        state = self.running()
+        if not state:
+            return 'No deployment is running'
+        return '\n'.join(self.send('restart', name) for name in ([name] if name else state['services']))
+
+    def clear(self):
+        state = self.running()
+        if state and state['pid'] != os.getpid():
+            return
+        for path in [self.state_file, self.control_file]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def print_status(self):
+        state = self.running()
+        if not state:
+            print('No deployment is running')
+            return
+        print("""
+Running deployment (supervisor pid {})
+=====================================
+""".format(state['pid']))
+        print(f'{"service":<36}{"state":<10}{"ready":<7}{"pid":>8}{"uptime":>9}{"restarts":>10}  ports')
+        for name, service in state['services'].items():
+            uptime = f'{time() - service["since"]:.0f}s' if service['since'] and service['state'] == 'running' else '-'
+            ports = ', '.join(str(port) for port in service['ports'])
+            print(f'{name:<36}{service["state"]:<10}{"yes" if service["ready"] else "no":<7}{service["pid"] or "-":>8}'
+                f'{uptime:>9}{service["restarts"]:>10}  {ports}')
+        print()
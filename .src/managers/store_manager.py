@@ -0,0 +1,123 @@
+import json
+import os
+import shutil
+from time import time
+from typing import Dict, List, Optional
+from utils import SystemInteract, Constants
+
+class StoreManager:
+    """Side by side store of installed artifact versions.
+
+    Every artifact that is installed into a service directory is hardlinked
+    into the store under its service directory, artifact and version, so
+    any number of versions of the same artifact are kept next to each other
+    without using extra disk space. Switching a service to a stored version
+    links each file back into place with an atomic rename, no download or
+    extraction is needed.
+
+    Args:
+        store_dir:
+            The store directory, defaults to the store folder in the artifact cache.
+
+    """
+    def __init__(self, store_dir: str = None):
+        cache_dir = os.path.expanduser(os.environ.get('CENM_CACHE_DIR', Constants.CACHE_DIR.value))
+        self.store_dir = store_dir or os.path.join(cache_dir, 'store')
+        self.sysi = SystemInteract()
+
+    def _version_dir(self, service) -> str:
+        return os.path.join(self.store_dir, service.dir, service.abb, service.version)
+
+    def get(self, service) -> Optional[Dict]:
+        """Get the manifest of the stored version of a service artifact
+
+        Returns:
+            The manifest if the version is stored, None otherwise.
+
+        """
+        try:
+            with open(os.path.join(self._version_dir(service), 'manifest.json'), 'r') as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        files_dir = os.path.join(self._version_dir(service), 'files')
+        if not all(os.path.isfile(os.path.join(files_dir, file)) for file in manifest['files']):
+            return None
+        return manifest
+
+    def add(self, service, files: List[str], size: int = None, checksum: str = None):
+        """Add an installed artifact version to the store
+
+        Args:
+            service:
+                The service the artifact belongs to.
+            files:
+                The paths the artifact was installed as, relative to the repo root.
+            size:
+                The size of the downloaded artifact in bytes.
+            checksum:
+                The sha256 checksum of the downloaded artifact.
+
+        """
+        version_dir = self._version_dir(service)
+        tmp_dir = f'{version_dir}.{os.getpid()}.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        try:
+            for file in files:
+                os.makedirs(os.path.dirname(os.path.join(tmp_dir, 'files', file)), exist_ok=True)
+                self.sysi.link(file, os.path.join(tmp_dir, 'files', file))
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+            json.dump({
+                'artifact': service.artifact_name,
+                'version': service.version,
+                'url': service.url,
+                'size': size,
+                'sha256': checksum,
+                'files': sorted(files),
+                'stored': time()
+            }, f, indent=2)
+        shutil.rmtree(version_dir, ignore_errors=True)
+        os.makedirs(os.path.dirname(version_dir), exist_ok=True)
+        os.rename(tmp_dir, version_dir)
+
+    def materialise(self, service) -> Optional[Dict]:
+        """Point a service at the stored version of its artifact
+
+        Each file is linked next to its target and renamed over it, so
+        every file is swapped atomically.
+
+        Returns:
+            The manifest of the version that was materialised, None if the version is not stored.
+
+        """
+        manifest = self.get(service)
+        if not manifest:
+            return None
+        files_dir = os.path.join(self._version_dir(service), 'files')
+        for file in manifest['files']:
+            os.makedirs(os.path.dirname(file) or '.', exist_ok=True)
+            tmp_file = f'{file}.{os.getpid()}.tmp'
+            if os.path.lexists(tmp_file):
+                os.remove(tmp_file)
+            self.sysi.link(os.path.join(files_dir, file), tmp_file)
+            os.replace(tmp_file, file)
+        return manifest
+
+    def versions(self) -> Dict[str, List[str]]:
+        """List the stored versions of every artifact
+
+        Returns:
+            A dictionary of stored versions keyed by service directory and artifact.
+
+        """
+        versions = {}
+        if not os.path.isdir(self.store_dir):
+            return versions
+        for service_dir in sorted(os.listdir(self.store_dir)):
+            for abb in sorted(os.listdir(os.path.join(self.store_dir, service_dir))):
+                stored = os.listdir(os.path.join(self.store_dir, service_dir, abb))
+                versions[f'{service_dir}/{abb}'] = sorted(v for v in stored if not v.endswith('.tmp'))
+        return versions
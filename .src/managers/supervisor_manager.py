@@ -0,0 +1,406 @@
+import os
+import queue
+import signal
+import subprocess
+import threading
+from logging import Logger
+from time import monotonic, sleep, time
+from typing import Callable, Dict, List, Optional, Tuple
+from managers.state_manager import StateManager
+
+class RestartPolicy:
+    """Restart policy of a supervised process.
+
+    Restarts are delayed with exponential backoff, the delay is reset once
+    the process stayed up for a while. A process that has to be restarted
+    too often within a time window trips the circuit breaker and is marked
+    as failed instead of being restarted again.
+
+    Args:
+        base_backoff:
+            The delay before the first restart, in seconds.
+        max_backoff:
+            The maximum delay before a restart, in seconds.
+        max_restarts:
+            The maximum number of restarts within the window.
+        window:
+            The window restarts are counted in, in seconds.
+        stable_after:
+            The time after which a running process resets the backoff, in seconds.
+
+    """
+    def __init__(self,
+        base_backoff: float = 1,
+        max_backoff: float = 60,
+        max_restarts: int = 5,
+        window: float = 300,
+        stable_after: float = 60
+    ):
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_restarts = max_restarts
+        self.window = window
+        self.stable_after = stable_after
+        self.restarts = 0
+        self.reason = None
+        self.failed = False
+        self.history = []
+        self.attempt = 0
+
+    def next_delay(self, uptime: float, reason: str) -> Optional[float]:
+        """Record that the process stopped and get the delay before restarting it
+
+        Args:
+            uptime:
+                How long the process was running, in seconds.
+            reason:
+                Why the process stopped.
+
+        Returns:
+            The delay in seconds, None if the process has failed and must not be restarted.
+
+        """
+        now = monotonic()
+        self.reason = reason
+        if uptime >= self.stable_after:
+            self.attempt = 0
+        self.history = [restart for restart in self.history if now - restart < self.window]
+        if len(self.history) >= self.max_restarts:
+            self.failed = True
+            return None
+        self.history.append(now)
+        self.restarts += 1
+        delay = min(self.base_backoff * 2 ** self.attempt, self.max_backoff)
+        self.attempt += 1
+        return delay
+
+class SupervisorManager:
+    """Supervisor for the service JVMs.
+
+    Every JVM is a direct child of the deployment process, started by its
+    launch function without a shell or a forked interpreter in between. A
+    thread per service runs the launch, which may first wait on other
+    services, and then waits on the JVM. Exits are reported to the
+    supervisor loop, which blocks until a JVM exits, a restart is due, the
+    status is logged or its step needs to run, so nothing runs while all
+    JVMs are healthy. Stopped JVMs are restarted following their
+    [RestartPolicy], without holding up the other services. The state of
+    every service is kept in the [StateManager] state file, and services
+    can be stopped and restarted from other shells through its control
+    socket. Those commands are run by the supervisor loop too, a stopped
+    JVM gets a grace period after SIGTERM before the loop kills it.
+
+    Args:
+        functions:
+            The function starting each service and returning its process, keyed by service name.
+        logger:
+            The logger of the deployment being supervised.
+        state:
+            Where the state of the services is kept, the CENM deployment state by default.
+
+    """
+    def __init__(self, functions: Dict[str, Callable[[], subprocess.Popen]], logger: Logger, state: StateManager = None):
+        self.functions = functions
+        self.processes: Dict[str, subprocess.Popen] = {}
+        self.policies: Dict[str, RestartPolicy] = {}
+        self.started: Dict[str, float] = {}
+        self.pending: Dict[str, float] = {}
+        self.since: Dict[str, float] = {}
+        self.details: Dict[str, Dict] = {}
+        self.active = set()
+        self.held = set()
+        self.restarting = set()
+        self.kills: Dict[str, Tuple[subprocess.Popen, float]] = {}
+        self.replies: Dict[str, Tuple[queue.Queue, str]] = {}
+        self.grace = 30
+        self.exits = queue.Queue()
+        self.stopping = False
+        self.state = state or StateManager()
+        self.logger = logger
+
+    def _reason(self, returncode: int) -> str:
+        if returncode < 0:
+            return f'killed by signal {-returncode}'
+        return f'exited with code {returncode}'
+
+    def _run(self, name: str):
+        try:
+            process = self.functions[name]()
+        except Exception as e:
+            self.exits.put((name, f'failed to start ({e})'))
+            return
+        self.processes[name] = process
+        self.since[name] = time()
+        if self.stopping:
+            self._signal(process, signal.SIGTERM)
+        self.publish()
+        self.exits.put((name, self._reason(process.wait())))
+
+    def start(self, name: str):
+        self.processes.pop(name, None)
+        self.policies.setdefault(name, RestartPolicy())
+        self.started[name] = monotonic()
+        self.active.add(name)
+        threading.Thread(target=self._run, args=(name,), name=name, daemon=True).start()
+
+    def _stopped(self, name: str, reason: str):
+        self.active.discard(name)
+        self.details.get(name, {})['ready'] = False
+        reply = self.replies.pop(name, None)
+        if reply:
+            reply[0].put(reply[1])
+        if name in self.held:
+            self.logger.info(f'{name} {reason}, stopped on request')
+            return
+        if name in self.restarting:
+            self.restarting.discard(name)
+            self.logger.info(f'{name} {reason}, restarting on request')
+            self.start(name)
+            return
+        policy = self.policies[name]
+        delay = policy.next_delay(monotonic() - self.started[name], reason)
+        if delay is None:
+            self.logger.error(f'{name} {reason}, restarted {policy.max_restarts} times within {policy.window:g}s, marking as failed')
+        else:
+            self.logger.error(f'{name} {reason}, restarting in {delay:g}s (restart {policy.restarts})')
+            self.pending[name] = monotonic() + delay
+
+    def _rss(self, pids: List[int]) -> float:
+        """Get the resident memory of processes in MB, from /proc or ps where there is no /proc
+
+        """
+        try:
+            pages = 0
+            for pid in pids:
+                with open(f'/proc/{pid}/statm', 'r') as f:
+                    pages += int(f.read().split()[1])
+            return pages * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+        except (OSError, ValueError):
+            out = subprocess.run(['ps', '-o', 'rss=', '-p', ','.join(str(pid) for pid in pids)], capture_output=True, text=True).stdout
+            return sum(int(rss) for rss in out.split()) / 1024
+
+    def footprint(self) -> Tuple[int, float]:
+        """Get the processes used by the deployment
+
+        Returns:
+            The number of processes, the supervisor and its JVMs, and their resident memory in MB.
+
+        """
+        pids = [os.getpid()] + [process.pid for process in self.processes.values() if process.poll() is None]
+        return len(pids), self._rss(pids)
+
+    def status(self) -> Dict[str, Dict]:
+        """Get the status of every supervised service
+
+        Returns:
+            The state, pid, restart count and last stop reason, keyed by service name.
+
+        """
+        status = {}
+        for name, policy in self.policies.items():
+            process = self.processes.get(name)
+            if policy.failed:
+                state = 'failed'
+            elif name in self.pending:
+                state = 'backoff'
+            elif name in self.active:
+                state = ('running' if process.poll() is None else 'stopped') if process else 'starting'
+            else:
+                state = 'stopped'
+            status[name] = {'state': state, 'pid': process.pid if process else None, 'restarts': policy.restarts, 'reason': policy.reason}
+        return status
+
+    def publish(self):
+        """Write the state of every service to the state file
+
+        """
+        services = {}
+        for name, status in self.status().items():
+            details = self.details.get(name, {})
+            services[name] = {
+                **status,
+                'since': self.since.get(name),
+                'ready': details.get('ready', False),
+                'ports': details.get('ports', [])
+            }
+        self.state.write(services)
+
+    def control(self, command: str, name: Optional[str]) -> str:
+        """Pass a command sent to the control socket to the supervisor loop and wait for it to be done
+
+        Args:
+            command:
+                stop or restart.
+            name:
+                The service to stop or restart.
+
+        Returns:
+            The reply sent back.
+
+        """
+        if name not in self.policies:
+            return f'Unknown service {name}, expected one of {", ".join(self.policies)}'
+        if command not in ['stop', 'restart']:
+            return f'Unknown command {command}'
+        reply = queue.Queue()
+        self.exits.put((name, (command, reply)))
+        try:
+            return reply.get(timeout=self.grace + 10)
+        except queue.Empty:
+            return f'{name} still stopping'
+
+    def _terminate(self, name: str, process: subprocess.Popen):
+        """Send SIGTERM to the process group of a JVM, the supervisor loop kills it if still running after the grace period
+
+        """
+        self.logger.info(f'Terminating {name} (process group {process.pid})')
+        self._signal(process, signal.SIGTERM)
+        self.kills[name] = (process, monotonic() + self.grace)
+
+    def _kill_overdue(self):
+        for name, (process, due) in list(self.kills.items()):
+            if due > monotonic():
+                continue
+            del self.kills[name]
+            if self._signal(process, 0):
+                self.logger.warning(f'{name} (process group {process.pid}) still running after {self.grace:g}s, killing')
+                self._signal(process, signal.SIGKILL)
+
+    def _control(self, name: str, command: str, reply: queue.Queue):
+        """Run a stop or restart command in the supervisor loop, replying once it is done
+
+        """
+        process = self.processes.get(name)
+        running = name in self.active and process is not None and process.poll() is None
+        done = f'{name} {"stopped" if command == "stop" else "restarted"}'
+        if command == 'stop':
+            self.held.add(name)
+            self.pending.pop(name, None)
+        else:
+            self.held.discard(name)
+            if running:
+                self.restarting.add(name)
+            elif name not in self.active:
+                self.pending.pop(name, None)
+                self.policies[name] = RestartPolicy()
+                self.start(name)
+        if running:
+            # Replied once the exit is seen
+            self.replies[name] = (reply, done)
+            self._terminate(name, process)
+        else:
+            reply.put(done)
+        self.publish()
+
+    def log_status(self):
+        count, rss = self.footprint()
+        self.logger.info(f'{count} processes (supervisor pid {os.getpid()} and {count - 1} JVMs) using {rss:.0f} MB')
+        for name, status in self.status().items():
+            reason = f', last {status["reason"]}' if status['reason'] else ''
+            self.logger.info(f'{name} is {status["state"]} (pid {status["pid"]}, {status["restarts"]} restarts{reason})')
+
+    def supervise(self, status_frequency: int = None, step: Callable[[], Optional[float]] = None):
+        """Restart services as they exit, runs until interrupted or every started service failed
+
+        Args:
+            status_frequency:
+                Seconds between logging the status of every service, never by default.
+            step:
+                A function run in the same loop e.g. to start services once
+                their dependencies are ready, it returns the seconds until it
+                needs to run again or None once it is done.
+
+        """
+        next_status = monotonic() + status_frequency if status_frequency else None
+        next_step = monotonic() if step else None
+        self.state.serve(self.control)
+        while True:
+            if next_step and monotonic() >= next_step:
+                delay = step()
+                next_step = monotonic() + delay if delay is not None else None
+            for name, due in list(self.pending.items()):
+                if due <= monotonic() and self.pending.pop(name, None):
+                    self.start(name)
+            if next_status and monotonic() >= next_status:
+                next_status += status_frequency
+                self.log_status()
+            self._kill_overdue()
+            if self.policies and all(policy.failed for policy in self.policies.values()):
+                self.logger.error('Every service has failed, stopping supervision')
+                return
+            deadlines = [*self.pending.values(), *[due for _, due in self.kills.values()], *[due for due in (next_status, next_step) if due]]
+            try:
+                name, reason = self.exits.get(timeout=max(min(deadlines) - monotonic(), 0) if deadlines else None)
+            except queue.Empty:
+                continue
+            if reason is None:
+                self.start(name)
+            elif isinstance(reason, tuple):
+                self._control(name, *reason)
+            else:
+                self._stopped(name, reason)
+                self.publish()
+
+    def _signal(self, process: subprocess.Popen, sig: int) -> bool:
+        """Send a signal to the process group of a JVM
+
+        Returns:
+            True if the group still has processes, False once it is gone.
+
+        """
+        try:
+            os.killpg(process.pid, sig)
+            return True
+        except (ProcessLookupError, PermissionError):
+            return False
+
+    def _stop(self, processes: Dict[str, subprocess.Popen], grace: float = 30) -> int:
+        """Send SIGTERM to the process groups of JVMs at once, SIGKILL those still running after the grace period
+
+        Returns:
+            The number of services that had to be killed.
+
+        """
+        for name, process in processes.items():
+            self.logger.info(f'Terminating {name} (process group {process.pid})')
+            self._signal(process, signal.SIGTERM)
+        deadline = monotonic() + grace
+        running = dict(processes)
+        while running:
+            for name, process in list(running.items()):
+                if process.poll() is not None and not self._signal(process, 0):
+                    del running[name]
+            if not running or monotonic() >= deadline:
+                break
+            sleep(0.1)
+        for name, process in running.items():
+            self.logger.warning(f'{name} (process group {process.pid}) still running after {grace:g}s, killing')
+            self._signal(process, signal.SIGKILL)
+        for process in running.values():
+            process.wait()
+        return len(running)
+
+    def terminate(self, grace: float = 30) -> List[subprocess.Popen]:
+        """Stop every JVM together with the processes it started
+
+        Every JVM runs in its own process group, the groups are all sent
+        SIGTERM at once and any group still running after the grace
+        period is killed with SIGKILL, so stopping takes at most the grace
+        period however many services are running.
+
+        Args:
+            grace:
+                The time every service gets to stop after SIGTERM, in seconds.
+
+        Returns:
+            The stopped processes.
+
+        """
+        self.stopping = True
+        self.pending.clear()
+        self.log_status()
+        processes = {name: process for name, process in self.processes.items() if self._signal(process, 0)}
+        killed = self._stop(processes, grace)
+        self.logger.info(f'Stopped {len(processes)} services, {killed} had to be killed')
+        self.state.clear()
+        return list(processes.values())
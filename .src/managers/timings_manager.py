@@ -0,0 +1,125 @@
+import json
+import os
+import threading
+from time import time
+from typing import Dict, List, Optional
+from utils import Constants
+
+class TimingsManager:
+    """Store of measured service startup times.
+
+    Every deployment records how long each service took from being started
+    to being ready, keyed by service, artifact version and java version.
+    The recorded percentiles replace the fixed deploy time constants as
+    timeouts and schedule estimates once a service has been deployed a few
+    times with the same version, until then the constants are used. Each
+    startup also records if it used a class data sharing archive, the
+    report compares the startups with and without one.
+
+    Args:
+        timings_file:
+            The path of the timings store.
+
+    """
+    MAX_SAMPLES = 50
+    MIN_SAMPLES = 3
+    # Head room on top of the slowest expected startup before timing out
+    TIMEOUT_FACTOR = 1.5
+
+    _write_lock = threading.Lock()
+
+    def __init__(self, timings_file: str = Constants.TIMINGS_FILE.value):
+        self.timings_file = timings_file
+
+    def _key(self, service) -> str:
+        return f'{service.abb}/{service.version}/java{service.java_version}'
+
+    def _read(self) -> Dict[str, List[Dict]]:
+        try:
+            with open(self.timings_file, 'r') as f:
+                return json.load(f)['timings']
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return {}
+
+    def _write(self, timings: Dict[str, List[Dict]]):
+        tmp_file = f'{self.timings_file}.{os.getpid()}.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({'version': 1, 'timings': dict(sorted(timings.items()))}, f, indent=2)
+        os.replace(tmp_file, self.timings_file)
+
+    def _percentile(self, samples: List[float], p: float) -> float:
+        samples = sorted(samples)
+        rank = (len(samples) - 1) * p / 100
+        low = int(rank)
+        high = min(low + 1, len(samples) - 1)
+        return samples[low] + (samples[high] - samples[low]) * (rank - low)
+
+    def record(self, service, seconds: float, ready_by: str):
+        """Record the time a service took to be ready
+
+        Args:
+            service:
+                The deployment service.
+            seconds:
+                The time from starting the service until it was ready.
+            ready_by:
+                How readiness was detected e.g. log or probe.
+
+        """
+        with self._write_lock:
+            timings = self._read()
+            samples = timings.setdefault(self._key(service), [])
+            samples.append({'seconds': round(seconds, 2), 'ready_by': ready_by, 'cds': service.cds_used, 'recorded': time()})
+            del samples[:-self.MAX_SAMPLES]
+            self._write(timings)
+
+    def percentile(self, service, p: float) -> Optional[float]:
+        """Get a percentile of the recorded startup times of a service
+
+        Returns:
+            The percentile in seconds, None if too few startups were recorded.
+
+        """
+        samples = [sample['seconds'] for sample in self._read().get(self._key(service), [])]
+        if len(samples) < self.MIN_SAMPLES:
+            return None
+        return self._percentile(samples, p)
+
+    def estimate(self, service) -> float:
+        """Estimate the startup time of a service, the median of its recorded startups
+
+        """
+        median = self.percentile(service, 50)
+        return median if median is not None else (service.deployment_time or 0)
+
+    def timeout(self, service) -> float:
+        """Get the time after which a starting service is not expected to become ready
+
+        """
+        p95 = self.percentile(service, 95)
+        return p95 * self.TIMEOUT_FACTOR if p95 is not None else (service.deployment_time or 0)
+
+    def print_report(self):
+        timings = self._read()
+        if not timings:
+            print('No startup timings recorded yet, they are recorded on every deployment')
+            return
+        print("""
+Service startup timings ({})
+=====================================
+""".format(self.timings_file))
+        print(f'{"service":<16}{"version":<14}{"java":<6}{"runs":>5}{"p50":>9}{"p95":>9}{"max":>9}{"last":>9}{"cds p50":>9}{"gain":>8}')
+        for key, samples in timings.items():
+            abb, version, java = key.split('/')
+            seconds = [sample['seconds'] for sample in samples]
+            with_cds = [sample['seconds'] for sample in samples if sample.get('cds')]
+            without_cds = [sample['seconds'] for sample in samples if not sample.get('cds')]
+            cds, gain = '-', '-'
+            if with_cds:
+                cds = f'{self._percentile(with_cds, 50):.1f}s'
+            if with_cds and without_cds:
+                gain = f'{100 * (1 - self._percentile(with_cds, 50) / self._percentile(without_cds, 50)):.0f}%'
+            print(f'{abb:<16}{version:<14}{java[4:]:<6}{len(seconds):>5}'
+                f'{self._percentile(seconds, 50):>8.1f}s{self._percentile(seconds, 95):>8.1f}s'
+                f'{max(seconds):>8.1f}s{seconds[-1]:>8.1f}s{cds:>9}{gain:>8}')
+        print()
@@ -0,0 +1,140 @@
+import functools
+import json
+import os
+import threading
+from contextlib import contextmanager
+from time import time
+from typing import Dict, List, Optional, Tuple
+
+class TraceManager:
+    """Timeline of the orchestration steps of a deployment.
+
+    Every traced step, e.g. running setupAuth.sh, a cenm-tool command or
+    waiting for a port, is recorded as a span with its start and end time
+    on the track of the thread it ran in, the threads running each service
+    are named after the service. Services get a span from being started to
+    being ready on their track. The spans are written as a Chrome trace
+    that can be opened in Perfetto or chrome://tracing.
+
+    Tracing is off unless enabled, spans are then not recorded.
+
+    """
+    enabled = False
+    origin = 0.0
+    events: List[Dict] = []
+    tracks: Dict[str, int] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def enable(cls):
+        cls.enabled = True
+        cls.origin = time()
+        cls.events = []
+        cls.tracks = {}
+
+    @classmethod
+    def _track(cls, name: str) -> int:
+        return cls.tracks.setdefault(name, len(cls.tracks) + 1)
+
+    @classmethod
+    def record(cls, name: str, start: float, end: float, category: str = 'step', track: str = None, **args):
+        """Record a span that already ended
+
+        Args:
+            name:
+                The name of the span.
+            start:
+                The start time of the span, as returned by time().
+            end:
+                The end time of the span.
+            category:
+                The kind of span e.g. step or service.
+            track:
+                The track to record the span on, the current thread by default.
+            args:
+                Details shown with the span.
+
+        """
+        if not cls.enabled:
+            return
+        with cls._lock:
+            cls.events.append({
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': round((start - cls.origin) * 1e6),
+                'dur': round((end - start) * 1e6),
+                'pid': os.getpid(),
+                'tid': cls._track(track or threading.current_thread().name),
+                'args': args
+            })
+
+    @classmethod
+    @contextmanager
+    def span(cls, name: str, category: str = 'step', **args):
+        start = time()
+        try:
+            yield
+        finally:
+            cls.record(name, start, time(), category, **args)
+
+    @classmethod
+    def spans(cls, track: str, start: float = None, end: float = None) -> List[Tuple[str, float]]:
+        """Get the steps recorded on a track, longest first
+
+        Args:
+            track:
+                The track, a thread or service name.
+            start:
+                Only steps ending after this time.
+            end:
+                Only steps starting before this time.
+
+        Returns:
+            The name and duration in seconds of every step.
+
+        """
+        with cls._lock:
+            tid = cls.tracks.get(track)
+            events = [event for event in cls.events if event['tid'] == tid and event['cat'] == 'step']
+        if start is not None:
+            events = [event for event in events if cls.origin + (event['ts'] + event['dur']) / 1e6 > start]
+        if end is not None:
+            events = [event for event in events if cls.origin + event['ts'] / 1e6 < end]
+        return sorted([(event['name'], event['dur'] / 1e6) for event in events], key=lambda span: -span[1])
+
+    @classmethod
+    def write(cls, path: str):
+        """Write the recorded spans as a Chrome trace
+
+        """
+        with cls._lock:
+            tracks = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}} for name, tid in cls.tracks.items()]
+            events = sorted(cls.events, key=lambda event: event['ts'])
+        tmp_file = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({
+                'traceEvents': [
+                    {'name': 'process_name', 'ph': 'M', 'pid': os.getpid(), 'tid': 0, 'args': {'name': 'cenm deployment'}},
+                    *tracks,
+                    *events
+                ],
+                'displayTimeUnit': 'ms',
+                'otherData': {'started': cls.origin}
+            }, f, separators=(',', ':'))
+        os.replace(tmp_file, path)
+
+def traced(func=None, *, name: Optional[str] = None):
+    """Decorator recording every call of a function as a span of the [TraceManager]
+
+    """
+    if func is None:
+        return functools.partial(traced, name=name)
+
+    @functools.wraps(func)
+    def new_func(*args, **kwargs):
+        if not TraceManager.enabled:
+            return func(*args, **kwargs)
+        with TraceManager.span(name or func.__qualname__):
+            return func(*args, **kwargs)
+    return new_func
@@ -1,8 +1,20 @@
 import os
+import subprocess
 from abc import ABC
+from time import time
+from typing import List, Optional
 from pyhocon import ConfigFactory
+from managers.archive_manager import ArchiveManager
 from managers.download_manager import DownloadManager
-from utils import SystemInteract, Logger, Constants, java_string
+from managers.index_manager import IndexManager
+from managers.lock_manager import LockManager
+from managers.cds_manager import CdsManager
+from managers.log_manager import LogTailer
+from managers.probe_manager import Probe, ProbeManager
+from managers.store_manager import StoreManager
+from managers.trace_manager import TraceManager, traced
+from managers.timings_manager import TimingsManager
+from utils import SystemInteract, Logger, Constants, java_env, jvm_flags
 import glob
 import uuid
 import re
@@ -48,6 +60,10 @@ class BaseService(ABC):
         self.version = version
         self.url = self.__build_url(url)
         self.dlm = DownloadManager(username, password)
+        self.archive = ArchiveManager()
+        self.index = IndexManager()
+        self.lock = LockManager()
+        self.store = StoreManager()
         self.sysi = SystemInteract()
         self.error = False
 
@@ -70,67 +86,136 @@ class BaseService(ABC):
             self.sysi.run(f'git clone {Constants.GITHUB_URL.value}/{self.dir}.git --quiet')
 
     def _check_presence(self) -> bool:
-        for _, _, files in os.walk(self.dir):
-            if f'{self.artifact_name}.jar' in files or f'{self.artifact_name}-{self.version}.jar' in files:
-                return True
-        return False
+        return self.index.find(self.dir, [f'{self.artifact_name}.jar', f'{self.artifact_name}-{self.version}.jar']) is not None
     
-    def _move(self):
-        self.sysi.run(f'mv {self._zip_name()} {self.dir}')
+    def _move(self) -> List[str]:
         if self.ext == "zip":
-            self.sysi.run(f'(cd {self.dir} && unzip -q -o {self._zip_name()} && rm {self._zip_name()})')
+            return [f'{self.dir}/{file}' for file in self.archive.extract(self._zip_name(), self.dir)]
+        self.sysi.run(f'mv {self._zip_name()} {self.dir}')
+        return [f'{self.dir}/{self._zip_name()}']
 
-    def download(self) -> bool:
+    def _prepare(self):
+        """Prepare the service directory before downloading, clones the service repo by default
+
+        """
         self._clone_repo()
-        if self._check_presence():
+
+    def _install(self) -> List[str]:
+        """Install the downloaded artifact into the service directory
+
+        Returns:
+            The paths the artifact was installed as, relative to the repo root.
+
+        """
+        return self._move()
+
+    def is_current(self) -> bool:
+        """Check the artifact is present and matches the version it was locked to
+
+        """
+        return self._check_presence() and not self.lock.is_stale(self)
+
+    def switch_version(self) -> bool:
+        """Switch the service to its configured artifact version from the local store
+
+        No network access is used, the service directory must already exist.
+
+        Returns:
+            True if the configured version is installed, False if it isn't stored locally.
+
+        """
+        if not self.sysi.path_exists(self.dir):
+            return False
+        if self.is_current():
+            return True
+        manifest = self.store.materialise(self)
+        if not manifest:
+            return False
+        self.lock.record(self, manifest['files'], manifest['size'], manifest['sha256'])
+        return True
+
+    def download(self) -> bool:
+        self._prepare()
+        if self.is_current():
+            entry = self.lock.get(self)
+            if not entry:
+                # Artifacts downloaded before the lockfile existed
+                path = self._artifact_path()
+                self.lock.record(self, [path] if path else [], checksum=self.dlm.cache.checksums(self._zip_name()).get('sha256'))
+            elif 'files_sha256' not in entry:
+                # Lock entries recorded before the installed files were checksummed
+                self.lock.record(self, entry['files'], entry['size'], entry['sha256'])
             return #self.dlm.validate_download(self.url)
-        # If artifact not present then download it
+        if self.switch_version():
+            print(f'Switched to stored {self._zip_name()}')
+            return False
+        # If artifact not present (or a different version is locked) then download it
         print(f'Downloading {self._zip_name()}')
         self.error = self.dlm.download(self.url)
-        self._move()
+        if not self.error:
+            size = os.path.getsize(self._zip_name())
+            checksum = self.dlm.cache.checksums(self._zip_name()).get('sha256')
+            files = self._install()
+            self.lock.record(self, files, size, checksum)
+            self.store.add(self, files, size, checksum)
         return self.error
 
-    # TODO: wip
-    def validate_artifact(self) -> bool:
-        raise NotImplementedError
-        # return all([self._check_presence(), self.dlm.validate_download(self.url)])
-        # return self.dlm.check_md5sum(f'{self.dir}/{self._zip_name()}', self.url)
+    def _artifact_path(self) -> Optional[str]:
+        """Find the downloaded artifact on disk, zip artifacts are extracted so never found
+
+        """
+        if self.ext != 'jar':
+            return None
+        return self.index.find(self.dir, [f'{self.artifact_name}-{self.version}.jar', f'{self.artifact_name}.jar'])
+
+    def validate_artifact(self) -> Optional[bool]:
+        """Validate the artifact against its published checksum without downloading it
+
+        Jar artifacts are hashed on disk. The files extracted from zip
+        artifacts are checked against the checksums recorded in the
+        lockfile when they were installed, then the checksum of the zip
+        they came from is validated.
+
+        Returns:
+            True if the checksums match, False if they do not and None if
+            the artifact could not be validated.
+
+        """
+        path = self._artifact_path()
+        if path:
+            local = self.dlm.file_checksums(path)
+        else:
+            damaged = self.lock.verify_files(self)
+            if damaged is None:
+                return None
+            if damaged:
+                print(f'Missing or changed since installed: {", ".join(damaged)}')
+                return False
+            entry = self.lock.get(self)
+            local = {**({'sha256': entry['sha256']} if entry['sha256'] else {}), **self.dlm.cache.checksums(self._zip_name())}
+        if not local:
+            return None
+        return self.dlm.verify_checksums(local, self.dlm.remote_checksums(self.url))
     
 class SignerPluginService(BaseService):
     """Base service for signing service plugins
     
     """
-    def _handle_plugin(self):
+    def _install(self) -> List[str]:
         if not self.sysi.path_exists(f'{self.dir}/plugins'):
             self.sysi.run(f'mkdir {self.dir}/plugins')
         self.sysi.run(f'mv {self._zip_name()} {self.dir}/plugins')
-
-    def download(self) -> bool:
-        if self._check_presence():
-            return
-        # If artifact not present then download it
-        print(f'Downloading {self._zip_name()}')
-        self.error = self.dlm.download(self.url)
-        self._handle_plugin()
-        return self.error
+        return [f'{self.dir}/plugins/{self._zip_name()}']
 
 class CordappService(BaseService):
     """Base service for CorDapps
     
     """
-    def _handle_cordapp(self):
+    def _install(self) -> List[str]:
         if not self.sysi.path_exists(f'{self.dir}/cordapps'):
             self.sysi.run(f'mkdir {self.dir}/cordapps')
         self.sysi.run(f'mv {self._zip_name()} {self.dir}/cordapps')
-    
-    def download(self) -> bool:
-        if self._check_presence():
-            return
-        # If artifact not present then download it
-        print(f'Downloading {self._zip_name()}')
-        self.error = self.dlm.download(self.url)
-        self._handle_cordapp()
-        return self.error
+        return [f'{self.dir}/cordapps/{self._zip_name()}']
 
 class DeploymentService(BaseService):
     """Base service for deployable services
@@ -142,14 +227,26 @@ class DeploymentService(BaseService):
             The name of the configuration file for the service
         deployment_time:
             The time taken for the service to deploy (average)
-            this gives an indication how long the deployment manager
-            should sleep before starting the next service
+            used until startup times have been recorded for the
+            service, see [TimingsManager]
         certificates:
             The number of certificates required for the service
         java_version:
             The version of java to use for the service
+        depends_on:
+            The directories (without the cenm- prefix) of the services
+            that need to be ready before this service is started
+        ready_probes:
+            The probes that pass once the service is ready
+        ready_log:
+            A pattern matching the line the service logs once it is ready,
+            if it is never logged the service counts as ready once its
+            probes pass and its expected startup time has passed
 
     """
+    # The heap sizes of the JVM profiles to use, see [JvmProfiles]
+    JVM_TYPE = 'cenm'
+
     def __init__(self,
         abb: str,
         dir: str,
@@ -162,7 +259,10 @@ class DeploymentService(BaseService):
         config_file: str,
         deployment_time: int,
         certificates: int = None,
-        java_version: int = 8
+        java_version: int = 8,
+        depends_on: List[str] = None,
+        ready_probes: List[Probe] = None,
+        ready_log: str = None
     ):
         super().__init__(
             abb, 
@@ -181,6 +281,16 @@ class DeploymentService(BaseService):
         self.deployment_time = deployment_time
         self.certificates = certificates
         self.java_version = java_version
+        self.depends_on = depends_on or []
+        self.ready_probes = ready_probes or []
+        self.ready_log = ready_log
+        self.prober = ProbeManager()
+        self.timings = TimingsManager()
+        self.log_tailer = None
+        self.launched = None
+        self.ready_by = None
+        self.jvm_profile = 'default'
+        self.cds_used = False
 
     def __str__(self) -> str:
         return f"DeploymentService[{self.abb}, {self.dir}, {self.artifact_name}, {self.ext}, {self.version}]"
@@ -192,16 +302,114 @@ class DeploymentService(BaseService):
         cert_count = self.sysi.run_get_stdout(f"ls {self.dir}/certificates | xargs | wc -w | sed -e 's/^ *//g'")
         return int(cert_count)
         
-    def deploy(self):
-        self.logger.info(f'Thread started to deploy {self.artifact_name}')
-        while True:
-            try:
-                self.logger.debug(f'[Running] (cd {self.dir} && {java_string(self.java_version)} && java -jar {self.artifact_name}.jar -f {self.config_file}) to start {self.artifact_name} service')
-                exit_code = self.sysi.run_get_exit_code(f'(cd {self.dir} && {java_string(self.java_version)} && java -jar {self.artifact_name}.jar -f {self.config_file})')
-                if exit_code != 0:
-                    raise RuntimeError(f'{self.artifact_name} service stopped')
-            except:
-                self.logger.warning(f'{self.artifact_name} service stopped. Restarting...')
+    def _log_dir(self) -> str:
+        return f'{self.dir}/logs'
+
+    def ports(self) -> List[int]:
+        """The ports the service listens on
+
+        """
+        return [probe.port for probe in self.ready_probes]
+
+    def watch_log(self):
+        """Start following the service logs for the readiness line, called on every launch of the service
+
+        """
+        self.log_tailer = LogTailer(self._log_dir(), self.ready_log) if self.ready_log else None
+        self.launched = None
+        self.ready_by = None
+
+    def wait_for_log(self, timeout: float = None) -> Optional[str]:
+        """Wait for the service to log its readiness line
+
+        Args:
+            timeout:
+                The maximum time to wait in seconds, waits forever by default.
+
+        Returns:
+            The readiness line, None if the service has no readiness line or the timeout passed first.
+
+        """
+        if not self.log_tailer:
+            return None
+        return self.log_tailer.wait(timeout)
+
+    def is_ready(self) -> bool:
+        """Check if the service is ready for the services that depend on it
+
+        """
+        if not all(self.prober.check(self.ready_probes).values()):
+            return False
+        if not self.ready_log:
+            self.ready_by = 'probe'
+            return True
+        if self.log_tailer is None:
+            self.watch_log()
+        if self.log_tailer.poll() is not None:
+            self.ready_by = 'log'
+            return True
+        # Fall back to the expected startup time in case the readiness line is never logged
+        if self.launched and time() - self.launched >= self.timings.timeout(self):
+            self.ready_by = 'timeout'
+            return True
+        return False
+
+    def _cwd(self) -> str:
+        return self.dir
+
+    def _command(self) -> List[str]:
+        """The java command line of the service, run from the service directory
+
+        """
+        return ['java', '-jar', f'{self.artifact_name}.jar', '-f', self.config_file]
+
+    def _prepare_launch(self):
+        """Run the steps needed before every start of the service, may block
+
+        """
+        pass
+
+    def jvm_flags(self) -> List[str]:
+        """The JVM flags of the service from its JVM profile
+
+        """
+        return jvm_flags(self.jvm_profile, self.JVM_TYPE, self.java_version)
+
+    def _env(self):
+        env = java_env(self.java_version)
+        if self.JVM_TYPE == 'angel' and self.jvm_profile != 'default':
+            # Picked up by the service JVM the angel starts, the angel's own flags take precedence
+            env['JAVA_TOOL_OPTIONS'] = ' '.join(jvm_flags(self.jvm_profile, 'cenm', self.java_version))
+        return env
+
+    def launch(self) -> subprocess.Popen:
+        """Start the service JVM
+
+        The JVM is started directly, without a shell, with JAVA_HOME set
+        for the java version of the service, in a process group of its own
+        so it can be stopped together with any process it starts. Waiting
+        on the process and restarting it is left to the [SupervisorManager].
+
+        Returns:
+            The started JVM process.
+
+        """
+        self.logger.info(f'Starting {self.artifact_name}')
+        # A restart must not count the readiness line of the previous run
+        self.watch_log()
+        with TraceManager.span(f'{type(self).__name__}._prepare_launch'):
+            self._prepare_launch()
+        cmd = self._command()
+        cds = CdsManager(self.java_version).flags(os.path.join(self._cwd(), cmd[cmd.index('-jar') + 1]))
+        self.cds_used = any(flag.startswith('-XX:SharedArchiveFile') for flag in cds)
+        cmd[1:1] = self.jvm_flags() + cds
+        self.logger.info(f'JVM profile {self.jvm_profile}: {" ".join(self.jvm_flags()) or "JVM defaults"}')
+        if cds:
+            self.logger.info(f'{"Using" if self.cds_used else "Building"} class data sharing archive of {self.artifact_name}')
+        self.logger.debug(f'[Running] {" ".join(cmd)} in {self._cwd()} to start {self.artifact_name} service')
+        # The startup time is measured from here, waiting on other services before is not part of it
+        self.launched = time()
+        return subprocess.Popen(cmd, cwd=self._cwd(), env=self._env(), stdin=subprocess.DEVNULL, start_new_session=True)
 
     def validate_config(self) -> str:
         try:
@@ -225,7 +433,7 @@ class DeploymentService(BaseService):
     def clean_artifacts(self):
         for root, dirs, files in os.walk(self.dir):
             for file in files:
-                if file.endswith('.jar'):
+                if file.endswith(('.jar', '.jsa', '.jsa.sha256')):
                     self.sysi.remove(os.path.join(root, file))
                 elif file in ["cenm", "cenm.cmd"]:
                     self.sysi.remove(os.path.join(root, file))
@@ -243,6 +451,9 @@ class NodeDeploymentService(DeploymentService):
     """Base service for a Corda Node
 
     """
+    NETWORK_PARAMETERS_SIGNED = r'(?i)network parameters.*\bsigned|signed network parameters'
+    JVM_TYPE = 'node'
+
     def __str__(self) -> str:
         return f"NodeDeploymentService[{self.abb}, {self.dir}, {self.artifact_name}, {self.ext}, {self.version}]"
 
@@ -286,42 +497,65 @@ class NodeDeploymentService(DeploymentService):
             config_file=self.config_file,
             deployment_time=self.deployment_time,
             certificates=self.certificates,
-            java_version=self.java_version
+            java_version=self.java_version,
+            depends_on=self.depends_on,
+            ready_probes=self.ready_probes,
+            ready_log=self.ready_log
         )
+        new_node.jvm_profile = self.jvm_profile
         if not self.sysi.path_exists(f'cenm-{new_dir}'):
             self._construct_new_node_dir(new_dir)
             new_node.download()
         return new_node
 
+    def ports(self) -> List[int]:
+        try:
+            config = ConfigFactory.parse_file(f'{self.dir}/{self.config_file}')
+        except Exception:
+            return []
+        addresses = [config.get(key, '') for key in ['p2pAddress', 'rpcSettings.address', 'rpcSettings.adminAddress']]
+        ports = [int(address.rsplit(':', 1)[-1]) for address in addresses if ':' in address]
+        if config.get('sshd.port', None):
+            ports.append(int(config.get('sshd.port')))
+        return ports
+
     def _is_registered(self) -> bool:
         return glob.glob(f'{self.dir}/nodeInfo-*')
 
+    def is_ready(self) -> bool:
+        if not self._is_registered():
+            return False
+        # The network map needs the node info of the notary before the notary can fully start
+        if self._notary():
+            self.ready_by = 'registered'
+            return True
+        return super().is_ready()
+
+    @traced
     def _register_node(self, artifact_name):
         self.logger.info('Registering node to the network')
-        self.sysi.wait_for_host_on_port(10000)
+        self.prober.wait([Probe('http', 10000)])
+        cds = CdsManager(self.java_version).flags(f'{self.dir}/{artifact_name}.jar', 'initial-registration')
+        cmd = ['java', *cds, '-jar', f'{artifact_name}.jar', 'initial-registration', '--network-root-truststore', './certificates/network-root-truststore.jks', '--network-root-truststore-password', 'trustpass', '-f', self.config_file]
         exit_code = -1
         while exit_code != 0:
-            self.logger.debug(f'[Running] (cd {self.dir} && {java_string(self.java_version)} && java -jar {artifact_name}.jar initial-registration --network-root-truststore ./certificates/network-root-truststore.jks --network-root-truststore-password trustpass -f {self.config_file}) to start {self.artifact_name} service')
-            exit_code = self.sysi.run_get_exit_code(f'(cd {self.dir} && {java_string(self.java_version)} && java -jar {artifact_name}.jar initial-registration --network-root-truststore ./certificates/network-root-truststore.jks --network-root-truststore-password trustpass -f {self.config_file})')
+            self.logger.debug(f'[Running] {" ".join(cmd)} in {self.dir} to register {self.artifact_name}')
+            exit_code = subprocess.run(cmd, cwd=self.dir, env=java_env(self.java_version), stdin=subprocess.DEVNULL).returncode
+
+    def _command(self) -> List[str]:
+        return ['java', '-jar', f'{self.artifact_name}-{self.version}.jar', '-f', self.config_file]
 
-    def deploy(self):
+    def _prepare_launch(self):
         artifact_name = f'{self.artifact_name}-{self.version}'
 
         if not self._is_registered():
             self._register_node(artifact_name)
-            self.sysi.wait_for_host_on_port(20000)
+            self.prober.wait([Probe('http', 20000)])
             # wait for network parameters to be signed
             if self._notary():
-                self.sysi.sleep(90)
-
-        while True:
-            try:
-                self.logger.debug(f'[Running] (cd {self.dir} && {java_string(self.java_version)} && java -jar {artifact_name}.jar -f {self.config_file}) to start {self.artifact_name} service')
-                exit_code = self.sysi.run_get_exit_code(f'(cd {self.dir} && {java_string(self.java_version)} && java -jar {artifact_name}.jar -f {self.config_file})')
-                if exit_code != 0:
-                    raise RuntimeError(f'{self.artifact_name} service stopped')
-            except:
-                self.logger.warning(f'{self.artifact_name} service stopped. Restarting...')
+                with TraceManager.span('wait for network parameters signed'):
+                    signed = LogTailer('cenm-nmap/logs', self.NETWORK_PARAMETERS_SIGNED, from_start=True).wait(timeout=90)
+                self.logger.info(signed or 'Network parameters not seen as signed after 90 seconds, starting anyway')
 
     def clean_runtime(self):
         for root, dirs, files in os.walk(self.dir):
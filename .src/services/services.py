@@ -1,9 +1,12 @@
 from pyhocon import ConfigFactory
 from services.base_services import BaseService, SignerPluginService, CordappService, DeploymentService, NodeDeploymentService
+from managers.cds_manager import CdsManager
 from managers.certificate_manager import CertificateManager
-from utils import java_string
+from managers.trace_manager import TraceManager, traced
+from utils import java_env
 from typing import List
 from time import sleep
+import subprocess
 import glob
 import os
 import re
@@ -16,69 +19,40 @@ class AuthService(DeploymentService):
             + '.*objectName\\": \\"\K.*(?=\\")/<SUBZONE_ID>/g" $file; done)')
         super().clean_runtime()
 
-    def deploy(self):
-        self.logger.info(f'Thread started to deploy {self.artifact_name}')
-        artifact_name = f'{self.artifact_name}-{self.version}'
-        while True:
-            try:
-                self.logger.debug(f'[Running] (cd {self.dir} && {java_string(self.java_version)} && java -jar {artifact_name}.jar -f {self.config_file} --initial-user-name admin --initial-user-password p4ssWord --keep-running --verbose) to start {self.artifact_name} service')
-                exit_code = self.sysi.run_get_exit_code(f'(cd {self.dir} && {java_string(self.java_version)} && java -jar {artifact_name}.jar -f {self.config_file} --initial-user-name admin --initial-user-password p4ssWord --keep-running --verbose)')
-                if exit_code != 0:
-                    raise RuntimeError(f'{self.artifact_name} service stopped')
-            except:
-                self.logger.warning(f'{self.artifact_name} service stopped. Restarting...')
+    def _command(self) -> List[str]:
+        return ['java', '-jar', f'{self.artifact_name}-{self.version}.jar', '-f', self.config_file, '--initial-user-name', 'admin', '--initial-user-password', 'p4ssWord', '--keep-running', '--verbose']
 
 class AuthClientService(BaseService):
     pass
 
 class AuthPluginService(BaseService):
 
-    def _handle_plugin(self):
+    def _install(self) -> List[str]:
         if not self.sysi.path_exists(f'{self.dir}/plugins'):
             self.sysi.run(f'mkdir {self.dir}/plugins')
         self.sysi.run(f'mv {self._zip_name()} {self.dir}/plugins/accounts-baseline-cenm.jar')
-
-    def download(self) -> bool:
-        if self._check_presence():
-            return
-        # If artifact not present then download it
-        print(f'Downloading {self._zip_name()}')
-        self.error = self.dlm.download(self.url)
-        self._handle_plugin()
-        return self.error
+        return [f'{self.dir}/plugins/accounts-baseline-cenm.jar']
 
 class GatewayService(DeploymentService):
 
-    def _handle_gateway(self):
+    def _install(self) -> List[str]:
         self.sysi.run(f'cp {self._zip_name()} {self.dir}/public')
         self.sysi.run(f'mv {self._zip_name()} {self.dir}/private')
+        return [f'{self.dir}/public/{self._zip_name()}', f'{self.dir}/private/{self._zip_name()}']
 
-    def download(self) -> bool:
-        self._clone_repo()
-        if self._check_presence():
-            return
-        # If artifact not present then download it
-        print(f'Downloading {self._zip_name()}')
-        self.error = self.dlm.download(self.url)
-        self._handle_gateway()
-        return self.error
+    def _log_dir(self) -> str:
+        return f'{self.dir}/private/logs'
 
     def _get_cert_count(self) -> bool:
         cert_count_1 = self.sysi.run_get_stdout(f"ls {self.dir}/private/certificates | xargs | wc -w | sed -e 's/^ *//g'")
         cert_count_2 = self.sysi.run_get_stdout(f"ls {self.dir}/public/certificates | xargs | wc -w | sed -e 's/^ *//g'")
         return int(cert_count_1) + int(cert_count_2)
 
-    def deploy(self):
-        self.logger.info(f'Thread started to deploy {self.artifact_name}')
-        artifact_name = f'{self.artifact_name}-{self.version}'
-        while True:
-            try:
-                self.logger.debug(f'[Running] (cd {self.dir}/private && {java_string(self.java_version)} && java -jar {artifact_name}.jar -f {self.config_file}) to start {self.artifact_name} service')
-                exit_code = self.sysi.run_get_exit_code(f'(cd {self.dir}/private && {java_string(self.java_version)} && java -jar {artifact_name}.jar -f {self.config_file})')
-                if exit_code != 0:
-                    raise RuntimeError(f'{self.artifact_name} service stopped')
-            except:
-                self.logger.warning(f'{self.artifact_name} service stopped. Restarting...')
+    def _cwd(self) -> str:
+        return f'{self.dir}/private'
+
+    def _command(self) -> List[str]:
+        return ['java', '-jar', f'{self.artifact_name}-{self.version}.jar', '-f', self.config_file]
 
     def validate_config(self) -> str:
         try:
@@ -96,41 +70,20 @@ class GatewayService(DeploymentService):
 
 class GatewayPluginService(BaseService):
 
-    def _handle_plugin(self):
+    def _install(self) -> List[str]:
         if not self.sysi.path_exists(f'{self.dir}/public/plugins'):
             self.sysi.run(f'mkdir -p {self.dir}/public/plugins')
         if not self.sysi.path_exists(f'{self.dir}/private/plugins'):
             self.sysi.run(f'mkdir -p {self.dir}/private/plugins')
         self.sysi.run(f'cp {self._zip_name()} {self.dir}/private/plugins/cenm-gateway-plugin.jar')
         self.sysi.run(f'mv {self._zip_name()} {self.dir}/public/plugins/cenm-gateway-plugin.jar')
-
-    def download(self) -> bool:
-        self._clone_repo()
-        if self._check_presence():
-            return
-        # If artifact not present then download it
-        print(f'Downloading {self._zip_name()}')
-        self.error = self.dlm.download(self.url)
-        self._handle_plugin()
-        return self.error
+        return [f'{self.dir}/private/plugins/cenm-gateway-plugin.jar', f'{self.dir}/public/plugins/cenm-gateway-plugin.jar']
 
 class CliToolService(BaseService):
 
-    def _handle_cli_tool(self):
-        if not self.sysi.path_exists(f'{self.dir}/cenm-tool'):
-            self.sysi.run(f'mkdir -p {self.dir}/cenm-tool')
-        self.sysi.run(f'mv {self._zip_name()} {self.dir}/cenm-tool')
-        self.sysi.run(f'(cd {self.dir}/cenm-tool && unzip -q -o {self._zip_name()} && rm {self._zip_name()} && chmod +x cenm)')
-
-    def download(self):
-        self._clone_repo()
-        if self._check_presence():
-            return
-        # If artifact not present then download it
-        print(f'Downloading {self._zip_name()}')
-        self.error = self.dlm.download(self.url)
-        self._handle_cli_tool()
-        return self.error
+    def _install(self) -> List[str]:
+        files = self.archive.extract(self._zip_name(), f'{self.dir}/cenm-tool', executables=['cenm'])
+        return [f'{self.dir}/cenm-tool/{file}' for file in files]
 
 class IdentityManagerService(DeploymentService):
     
@@ -142,27 +95,22 @@ class IdentityManagerService(DeploymentService):
         super().clean_artifacts()
 
 class IdentityManagerAngelService(IdentityManagerService):
+    JVM_TYPE = 'angel'
 
-    def deploy(self):
-        self.logger.info(f'Thread started to deploy {self.artifact_name}')
-
-        while not glob.glob(f'{self.dir}/token'):
-            self.logger.info(f'Waiting for token file to be created')
-            sleep(5)
+    def _prepare_launch(self):
+        with TraceManager.span('wait for token'):
+            while not glob.glob(f'{self.dir}/token'):
+                self.logger.info(f'Waiting for token file to be created')
+                sleep(5)
 
-        token = self.sysi.run_get_stdout(f'(cd {self.dir} && head -1 token)').strip()
+    def _command(self) -> List[str]:
+        with open(f'{self.dir}/token', 'r') as f:
+            token = f.readline().strip()
         # TODO: duplicated, remove before commit
         print(f'Identity Manager token: {token}')
-        print(f'[Running] (cd {self.dir} && {java_string(self.java_version)} && java -jar {self.artifact_name}.jar --jar-name=identitymanager.jar --zone-host=127.0.0.1 --zone-port=5061 --token={token} --service=IDENTITY_MANAGER --polling-interval=10 --working-dir=./ --tls=true --tls-keystore=./certificates/corda-ssl-identity-manager-keys.jks --tls-keystore-password=password --tls-truststore=./certificates/corda-ssl-trust-store.jks --tls-truststore-password=trustpass --verbose)')
-
-        while True:
-            try:
-                self.logger.debug(f'[Running] (cd {self.dir} && {java_string(self.java_version)} && java -jar {self.artifact_name}.jar --jar-name=identitymanager.jar --zone-host=127.0.0.1 --zone-port=5061 --token={token} --service=IDENTITY_MANAGER --polling-interval=10 --working-dir=./ --tls=true --tls-keystore=./certificates/corda-ssl-identity-manager-keys.jks --tls-keystore-password=password --tls-truststore=./certificates/corda-ssl-trust-store.jks --tls-truststore-password=trustpass --verbose)')
-                exit_code = self.sysi.run_get_exit_code(f'(cd {self.dir} && {java_string(self.java_version)} && java -jar {self.artifact_name}.jar --jar-name=identitymanager.jar --zone-host=127.0.0.1 --zone-port=5061 --token={token} --service=IDENTITY_MANAGER --polling-interval=10 --working-dir=./ --tls=true --tls-keystore=./certificates/corda-ssl-identity-manager-keys.jks --tls-keystore-password=password --tls-truststore=./certificates/corda-ssl-trust-store.jks --tls-truststore-password=trustpass --verbose)')
-                if exit_code != 0:
-                    raise RuntimeError(f'{self.artifact_name} service stopped')
-            except:
-                self.logger.warning(f'{self.artifact_name} service stopped. Restarting...')
+        cmd = ['java', '-jar', f'{self.artifact_name}.jar', '--jar-name=identitymanager.jar', '--zone-host=127.0.0.1', '--zone-port=5061', f'--token={token}', '--service=IDENTITY_MANAGER', '--polling-interval=10', '--working-dir=./', '--tls=true', '--tls-keystore=./certificates/corda-ssl-identity-manager-keys.jks', '--tls-keystore-password=password', '--tls-truststore=./certificates/corda-ssl-trust-store.jks', '--tls-truststore-password=trustpass', '--verbose']
+        print(f'[Running] {" ".join(cmd)}')
+        return cmd
 
     def clean_runtime(self):
         for root, dirs, files in os.walk(self.dir):
@@ -174,33 +122,18 @@ class IdentityManagerAngelService(IdentityManagerService):
 class CrrToolService(BaseService):
 
     def _check_presence(self) -> bool:
-        for _, _, files in os.walk(f'{self.dir}/tools/{self.artifact_name}'):
-            if 'crrsubmissiontool.jar' in files:
-                return True
-        return False
-
-    def _handle_crr_tool(self):
-        if not self.sysi.path_exists(f'{self.dir}/tools'):
-            self.sysi.run(f'mkdir -p {self.dir}/tools')
-        self.sysi.run(f'mkdir -p {self.dir}/tools/{self.artifact_name}')
-        self.sysi.run(f'mv {self._zip_name()} {self.dir}/tools/{self.artifact_name}')
-        self.sysi.run(f'(cd {self.dir}/tools/{self.artifact_name} && unzip -q -o {self._zip_name()} && rm {self._zip_name()})')
-
-    def download(self):
-        self._clone_repo()
-        if self._check_presence():
-            return
-        # If artifact not present then download it
-        print(f'Downloading {self._zip_name()}')
-        self.error = self.dlm.download(self.url)
-        self._handle_crr_tool()
-        return self.error
+        return self.index.find(f'{self.dir}/tools/{self.artifact_name}', ['crrsubmissiontool.jar']) is not None
+
+    def _install(self) -> List[str]:
+        files = self.archive.extract(self._zip_name(), f'{self.dir}/tools/{self.artifact_name}')
+        return [f'{self.dir}/tools/{self.artifact_name}/{file}' for file in files]
 
 class NetworkMapService(DeploymentService):
 
     def _node_info(self) -> bool:
         return glob.glob(f'cenm-nmap/nodeInfo-*') and glob.glob(f'cenm-notary/nodeInfo*')
 
+    @traced
     def _copy_notary_node_info(self):
         self.logger.info(f'Copying notary node info to nmap')
         while not glob.glob('cenm-notary/nodeInfo-*'):
@@ -212,9 +145,14 @@ class NetworkMapService(DeploymentService):
         new_params = self.sysi.run_get_stdout(f'(cd cenm-nmap && cat network-parameters-init.conf)')
         self.logger.info(f'new networkparams:\n{new_params}')
         
+    @traced
     def _set_network_params(self):
         self.logger.info(f'Setting network parameters')
-        self.sysi.run(f'cd {self.dir} && {java_string(self.java_version)} && java -jar networkmap.jar -f networkmap-init.conf --set-network-parameters network-parameters-init.conf --network-truststore ./certificates/network-root-truststore.jks --truststore-password trustpass --root-alias cordarootca')
+        cds = CdsManager(self.java_version).flags(f'{self.dir}/networkmap.jar', 'set-network-parameters')
+        subprocess.run(
+            ['java', *cds, '-jar', 'networkmap.jar', '-f', 'networkmap-init.conf', '--set-network-parameters', 'network-parameters-init.conf', '--network-truststore', './certificates/network-root-truststore.jks', '--truststore-password', 'trustpass', '--root-alias', 'cordarootca'],
+            cwd=self.dir, env=java_env(self.java_version), stdin=subprocess.DEVNULL
+        )
 
     def clean_runtime(self):
         for root, dirs, files in os.walk(self.dir):
@@ -225,35 +163,26 @@ class NetworkMapService(DeploymentService):
                     self.sysi.run(f'perl -i -pe "s/^.*notaryNodeInfoFile: \\"\K.*(?=\\")/INSERT_NODE_INFO_FILE_NAME_HERE/" {os.path.join(root, file)}')
         super().clean_runtime()
 
-    def deploy(self):
+    def _prepare_launch(self):
         if not self._node_info():
             self._copy_notary_node_info()
             self._set_network_params()
-        super().deploy()
 
 class NetworkMapAngelService(NetworkMapService):
+    JVM_TYPE = 'angel'
 
-    def deploy(self):
-        self.logger.info(f'Thread started to deploy {self.artifact_name}')
-
-        if not self._node_info():
-            self._copy_notary_node_info()
-            self._set_network_params()
-
-        while not glob.glob(f'{self.dir}/token'):
-            self.logger.info(f'Waiting for token file to be created')
-            sleep(5)
+    def _prepare_launch(self):
+        super()._prepare_launch()
 
-        token = self.sysi.run_get_stdout(f'(cd {self.dir} && head -1 token)').strip()
+        with TraceManager.span('wait for token'):
+            while not glob.glob(f'{self.dir}/token'):
+                self.logger.info(f'Waiting for token file to be created')
+                sleep(5)
 
-        while True:
-            try:
-                self.logger.debug(f'[Running] (cd {self.dir} && {java_string(self.java_version)} && java -jar {self.artifact_name}.jar --jar-name=networkmap.jar --zone-host=127.0.0.1 --zone-port=5061 --token={token} --service=NETWORK_MAP --polling-interval=10 --working-dir=./ --network-truststore=./certificates/network-root-truststore.jks --truststore-password=trustpass --root-alias=cordarootca --network-parameters-file=network-parameters.conf --tls=true --tls-keystore=./certificates/corda-ssl-network-map-keys.jks --tls-keystore-password=password --tls-truststore=./certificates/corda-ssl-trust-store.jks --tls-truststore-password=trustpass --verbose)')
-                exit_code = self.sysi.run_get_exit_code(f'(cd {self.dir} && {java_string(self.java_version)} && java -jar {self.artifact_name}.jar --jar-name=networkmap.jar --zone-host=127.0.0.1 --zone-port=5061 --token={token} --service=NETWORK_MAP --polling-interval=10 --working-dir=./ --network-truststore=./certificates/network-root-truststore.jks --truststore-password=trustpass --root-alias=cordarootca --network-parameters-file=network-parameters.conf --tls=true --tls-keystore=./certificates/corda-ssl-network-map-keys.jks --tls-keystore-password=password --tls-truststore=./certificates/corda-ssl-trust-store.jks --tls-truststore-password=trustpass --verbose)')
-                if exit_code != 0:
-                    raise RuntimeError(f'{self.artifact_name} service stopped')
-            except:
-                self.logger.warning(f'{self.artifact_name} service stopped. Restarting...')
+    def _command(self) -> List[str]:
+        with open(f'{self.dir}/token', 'r') as f:
+            token = f.readline().strip()
+        return ['java', '-jar', f'{self.artifact_name}.jar', '--jar-name=networkmap.jar', '--zone-host=127.0.0.1', '--zone-port=5061', f'--token={token}', '--service=NETWORK_MAP', '--polling-interval=10', '--working-dir=./', '--network-truststore=./certificates/network-root-truststore.jks', '--truststore-password=trustpass', '--root-alias=cordarootca', '--network-parameters-file=network-parameters.conf', '--tls=true', '--tls-keystore=./certificates/corda-ssl-network-map-keys.jks', '--tls-keystore-password=password', '--tls-truststore=./certificates/corda-ssl-trust-store.jks', '--tls-truststore-password=trustpass', '--verbose']
 
     def clean_runtime(self):
         for root, dirs, files in os.walk(self.dir):
@@ -264,34 +193,33 @@ class NetworkMapAngelService(NetworkMapService):
 
 class NotaryService(NodeDeploymentService):
     
-    def _move(self):
+    def _move(self) -> List[str]:
+        files = [f'{self.dir}/{self._zip_name()}']
+        # Share the corda jar with the node so it is not downloaded twice
+        if self.sysi.path_exists('cenm-node') and not self.sysi.path_exists(f'cenm-node/{self._zip_name()}'):
+            self.sysi.run(f'cp {self._zip_name()} cenm-node/{self._zip_name()}')
+            files.append(f'cenm-node/{self._zip_name()}')
         self.sysi.run(f'mv {self._zip_name()} {self.dir}/{self._zip_name()}')
-        if self.sysi.path_exists('cenm-node'):
-            self.sysi.run(f'mv {self._zip_name()} cenm-node/{self._zip_name()} > /dev/null 2>&1')
+        return files
 
 class NodeService(NodeDeploymentService):
 
-    def _move(self):
+    def _move(self) -> List[str]:
+        files = [f'{self.dir}/{self._zip_name()}']
+        # Share the corda jar with the notary so it is not downloaded twice
+        if self.sysi.path_exists('cenm-notary') and not self.sysi.path_exists(f'cenm-notary/{self._zip_name()}'):
+            self.sysi.run(f'cp {self._zip_name()} cenm-notary/{self._zip_name()}')
+            files.append(f'cenm-notary/{self._zip_name()}')
         self.sysi.run(f'mv {self._zip_name()} {self.dir}/{self._zip_name()}')
-        if self.sysi.path_exists('cenm-notary'):
-            self.sysi.run(f'mv {self._zip_name()} cenm-notary/{self._zip_name()} > /dev/null 2>&1')
+        return files
 
 class CordaShellService(BaseService):
 
-    def _handle_corda_shell(self):
+    def _install(self) -> List[str]:
         # if not self.sysi.path_exists(f'{self.dir}/drivers'):
         #     self.sysi.run(f'mkdir -p {self.dir}/drivers')
         self.sysi.run(f'mv {self._zip_name()} {self.dir}/drivers/{self._zip_name()} > /dev/null 2>&1')
-
-    def download(self):
-        self._clone_repo()
-        if self._check_presence():
-            return
-        # If artifact not present then download it
-        print(f'Downloading {self._zip_name()}')
-        self.error = self.dlm.download(self.url)
-        self._handle_corda_shell()
-        return self.error
+        return [f'{self.dir}/drivers/{self._zip_name()}']
 
 class CordaToolsHaUtilitiesService(DeploymentService):
 
@@ -300,18 +228,12 @@ class CordaToolsHaUtilitiesService(DeploymentService):
             print(f'Creating {self.dir}')
             self.sysi.run(f'mkdir {self.dir}')
 
-    def _move(self):
-        self.sysi.run(f'mv {self._zip_name()} {self.dir}/{self._zip_name(no_version=True)}')
-
-    def download(self) -> bool:
+    def _prepare(self):
         self._create_dir()
-        if self._check_presence():
-            return
-        # If artifact not present then download it
-        print(f'Downloading {self._zip_name()}')
-        self.error = self.dlm.download(self.url)
-        self._move()
-        return self.error
+
+    def _move(self) -> List[str]:
+        self.sysi.run(f'mv {self._zip_name()} {self.dir}/{self._zip_name(no_version=True)}')
+        return [f'{self.dir}/{self._zip_name(no_version=True)}']
     
 class FinanceContractsCordapp(CordappService):
     pass
@@ -322,22 +244,7 @@ class FinanceWorkflowsCordapp(CordappService):
 class PkiToolService(DeploymentService):
 
     def _check_presence(self) -> bool:
-        for _, _, files in os.walk(self.dir):
-            if 'pkitool.jar' in files:
-                # Temporarily muting this message
-                # print(f'pkitool.jar already exists. Skipping.')
-                return True
-        return False
-
-    def download(self) -> bool:
-        self._clone_repo()
-        if self._check_presence():
-            return
-        # If artifact not present then download it
-        print(f'Downloading {self._zip_name()}')
-        self.error = self.dlm.download(self.url)
-        self._move()
-        return self.error
+        return self.index.find(self.dir, ['pkitool.jar']) is not None
 
     def deploy(self):
         cert_manager = CertificateManager(self.version)
@@ -396,15 +303,8 @@ class SignerPluginCAService(SignerPluginService):
 
 class ZoneService(DeploymentService):
 
-    def deploy(self):
-        while True:
-            try:
-                self.logger.debug(f'Running: (cd {self.dir} && {java_string(self.java_version)} && java -jar {self.artifact_name}.jar --driver-class-name=org.h2.Driver --jdbc-driver= --user=zoneuser --password=password --url="jdbc:h2:file:./h2/zone-persistence;DB_CLOSE_ON_EXIT=FALSE;LOCK_TIMEOUT=10000;WRITE_DELAY=0;AUTO_SERVER_PORT=0" --run-migration=true --enm-listener-port=5061 --admin-listener-port=5063 --auth-host=127.0.0.1 --auth-port=8081 --auth-trust-store-location certificates/corda-ssl-trust-store.jks --auth-trust-store-password trustpass --auth-issuer "http://test" --auth-leeway 5 --tls=true --tls-keystore=certificates/corda-ssl-identity-manager-keys.jks --tls-keystore-password=password --tls-truststore=certificates/corda-ssl-trust-store.jks --tls-truststore-password=trustpass) to start zone service')
-                exit_code = self.sysi.run_get_exit_code(f'(cd {self.dir} && {java_string(self.java_version)} && java -jar {self.artifact_name}.jar --driver-class-name=org.h2.Driver --jdbc-driver= --user=zoneuser --password=password --url="jdbc:h2:file:./h2/zone-persistence;DB_CLOSE_ON_EXIT=FALSE;LOCK_TIMEOUT=10000;WRITE_DELAY=0;AUTO_SERVER_PORT=0" --run-migration=true --enm-listener-port=5061 --admin-listener-port=5063 --auth-host=127.0.0.1 --auth-port=8081 --auth-trust-store-location certificates/corda-ssl-trust-store.jks --auth-trust-store-password trustpass --auth-issuer "http://test" --auth-leeway 5 --tls=true --tls-keystore=certificates/corda-ssl-identity-manager-keys.jks --tls-keystore-password=password --tls-truststore=certificates/corda-ssl-trust-store.jks --tls-truststore-password=trustpass)')
-                if exit_code != 0:
-                    raise RuntimeError(f'{self.artifact_name} service stopped')
-            except:
-                self.logger.warning(f'{self.artifact_name} service stopped. Restarting...')
+    def _command(self) -> List[str]:
+        return ['java', '-jar', f'{self.artifact_name}.jar', '--driver-class-name=org.h2.Driver', '--jdbc-driver=', '--user=zoneuser', '--password=password', '--url=jdbc:h2:file:./h2/zone-persistence;DB_CLOSE_ON_EXIT=FALSE;LOCK_TIMEOUT=10000;WRITE_DELAY=0;AUTO_SERVER_PORT=0', '--run-migration=true', '--enm-listener-port=5061', '--admin-listener-port=5063', '--auth-host=127.0.0.1', '--auth-port=8081', '--auth-trust-store-location', 'certificates/corda-ssl-trust-store.jks', '--auth-trust-store-password', 'trustpass', '--auth-issuer', 'http://test', '--auth-leeway', '5', '--tls=true', '--tls-keystore=certificates/corda-ssl-identity-manager-keys.jks', '--tls-keystore-password=password', '--tls-truststore=certificates/corda-ssl-trust-store.jks', '--tls-truststore-password=trustpass']
     
     def validate_config(self) -> str:
         return ""
\ No newline at end of file
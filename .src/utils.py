@@ -1,12 +1,16 @@
 import logging
 import os
 import re
+import shutil
 from enum import Enum
 from typing import List, Dict, Optional
 from sys import platform
 import warnings
 import functools
+import itertools
 import uuid
+from managers.cds_manager import CdsManager
+from managers.trace_manager import TraceManager
 
 def deprecated(func):
     """This is a decorator which can be used to mark functions
@@ -36,6 +40,17 @@ class Constants(Enum):
     POSTGRES_DRIVER = 'https://repo1.maven.org/maven2/org/postgresql/postgresql/42.5.2/postgresql-42.5.2.jar'
     ORACLE_DRIVER = 'https://repo1.maven.org/maven2/com/oracle/ojdbc/ojdbc8/19.3.0.0/ojdbc8-19.3.0.0.jar'
 
+    CACHE_DIR = '~/.cache/cenm-deployment-local'
+    CACHE_MAX_SIZE_GB = 10
+    LOCK_FILE = 'cenm-artifacts.lock'
+    INDEX_FILE = 'cenm-presence.index'
+    TIMINGS_FILE = 'cenm-timings.json'
+    STATE_FILE = 'cenm-state.json'
+    CONTROL_FILE = 'cenm-control.sock'
+    NODES_STATE_FILE = 'cenm-nodes-state.json'
+    NODES_CONTROL_FILE = 'cenm-nodes-control.sock'
+    SNAPSHOT_DIR = 'cenm-snapshots'
+
     REPOS = ['auth', 'gateway', 'idman', 'nmap', 'notary', 'node', 'pki', 'signer', 'zone']
     DB_SERVICES = ['auth', 'idman', 'nmap', 'notary', 'node', 'zone']
 
@@ -74,9 +89,50 @@ class DeployTimeAngelConstants(Enum):
     NOTARY_DEPLOY_TIME = 5
     NODE_DEPLOY_TIME = 30
 
+class JvmProfiles(Enum):
+    """JVM flags of each profile: heap sizes by service type, then flags by java version
+
+    The default profile passes no flags, leaving the JVM ergonomics e.g.
+    a quarter of the host memory as maximum heap for every JVM. Angels get
+    their own small heap, the services they run use the cenm heap.
+
+    """
+    DEFAULT = {}
+    STANDARD = {
+        'heap': {'cenm': ('128m', '1g'), 'angel': ('32m', '128m'), 'node': ('512m', '2g')},
+        # G1 is only the default collector from java 9
+        'java8': ['-XX:+UseG1GC', '-XX:+UseStringDeduplication', '-XX:+ExitOnOutOfMemoryError'],
+        'java17': ['-XX:+UseStringDeduplication', '-XX:+ExitOnOutOfMemoryError']
+    }
+    # For dense local networks: small heaps, serial GC and C1 only for fast startup
+    SMALL = {
+        'heap': {'cenm': ('64m', '512m'), 'angel': ('16m', '64m'), 'node': ('256m', '1g')},
+        'java8': ['-XX:+UseSerialGC', '-XX:TieredStopAtLevel=1', '-Xss512k', '-XX:ReservedCodeCacheSize=64m', '-XX:-UsePerfData', '-XX:+ExitOnOutOfMemoryError'],
+        # A single compiler thread is only allowed without tiered compilation from java 9
+        'java17': ['-XX:+UseSerialGC', '-XX:TieredStopAtLevel=1', '-XX:CICompilerCount=1', '-Xss512k', '-XX:ReservedCodeCacheSize=64m', '-XX:-UsePerfData', '-XX:+ExitOnOutOfMemoryError']
+    }
+
+def jvm_flags(profile: str, jvm_type: str, java_version: int) -> List[str]:
+    """JVM flags of a profile for a type of service, cenm, angel or node
+
+    """
+    flags = JvmProfiles[profile.upper()].value
+    if not flags:
+        return []
+    initial, maximum = flags['heap'][jvm_type]
+    return [f'-Xms{initial}', f'-Xmx{maximum}', *flags['java8' if java_version < 9 else 'java17']]
+
+def java_home(java_version: int) -> str:
+    return re.sub(r"\d+", str(java_version), os.environ.get('JAVA_HOME', ''))
+
 def java_string(java_version: int) -> str:
-    java_home = re.sub(r"\d+", str(java_version), SystemInteract().run_get_stdout('echo $JAVA_HOME').strip())
-    return f'unset JAVA_HOME; export JAVA_HOME={java_home}'
+    return f'unset JAVA_HOME; export JAVA_HOME={java_home(java_version)}'
+
+def java_env(java_version: int) -> Dict[str, str]:
+    """Environment for running java directly, without a shell
+
+    """
+    return {**os.environ, 'JAVA_HOME': java_home(java_version)}
 
 def get_cenm_java_version(version: str) -> int:
     cenm_sub_version = re.findall(r'\.(\d+).?', version)[0]
@@ -242,6 +298,25 @@ class SystemInteract:
         else:
             os.system(f'rm -rf {path}')
 
+    def link(self, source: str, destination: str):
+        """Materialise a file by hardlink, falling back to a reflink and then a copy
+
+        Args:
+            source:
+                The file to link.
+            destination:
+                The path to create, must not exist.
+
+        """
+        try:
+            os.link(source, destination)
+            return
+        except OSError:
+            pass
+        reflink = 'cp -c' if self.platform == Platform.OSX else 'cp --reflink=always'
+        if self.run_get_exit_code(f'{reflink} {source} {destination}', silent=True) != 0:
+            shutil.copyfile(source, destination)
+
     def create_file_with(self, path: str, content: str):
         """Creates a file with content
 
@@ -321,22 +396,6 @@ class SystemInteract:
             out = 'E: Could not read stdout'
             self.remove(unique_file, silent=True)
         return out
-    
-    def wait_for_host_on_port(self, port: int, host: str = "localhost"):
-        """Waits for a host to be available on a port
-
-        Args:
-            port:
-                The port to wait on.
-            host:
-                The host to wait on, default is localhost.
-
-        """
-        wait_code = "G" if self.platform == Platform.OSX else "w"
-        while self.run_get_exit_code(f'nc -z -{wait_code} 3 {host} {port} > /dev/null 2>&1') != 0:
-            self.sleep(5)
-        # Safety sleep to allow service on [port] to fully start
-        self.sleep(10)
 
 class CenmTool:
     """Class for using cenm cli tool
@@ -355,7 +414,10 @@ class CenmTool:
 
     def _run(self, cmd: str):
         print(f'Running: {cmd}')
-        return self.sysi.run_get_stdout(f'(cd {self.path} && {java_string(self.java_version)} && java -jar {self.jar} {cmd})')
+        # Only the subcommand, the options hold passwords and tokens
+        subcommand = ' '.join(itertools.takewhile(lambda word: not word.startswith('-'), cmd.split()))
+        with TraceManager.span(f'cenm-tool {subcommand}'):
+            return self.sysi.run_get_stdout(f'(cd {self.path} && {java_string(self.java_version)} && {CdsManager(self.java_version).java(f"{self.path}/{self.jar}")} {cmd})')
 
     def _login(self, username: str, password: str):
         self._run(f'context login -s {self.host} -u {username} -p {password}')
@@ -409,8 +471,9 @@ class CenmTool:
 
         self.sysi.create_file_with(f'cenm-idman/token', tokens['idman'])
 
-        while not self.sysi.file_contains("cenm-nmap/network-parameters-init.conf", "notaryNodeInfoFile.*nodeInfo"):
-            self.sysi.sleep(5)
+        with TraceManager.span('wait for notary node info'):
+            while not self.sysi.file_contains("cenm-nmap/network-parameters-init.conf", "notaryNodeInfoFile.*nodeInfo"):
+                self.sysi.sleep(5)
 
         # print(self.sysi.run_get_stdout(f'(cd {self.path} && cat ../../cenm-nmap/network-parameters-init.conf)'))
         tokens['nmap'] = self.create_zone(
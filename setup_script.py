@@ -4,6 +4,7 @@ if f'{os.getcwd()}/.src' not in sys.path:
     sys.path.append(f'{os.getcwd()}/.src')
 import argparse
 import warnings
+from time import strftime
 from typing import Dict
 from managers.service_manager import ServiceManager
 from utils import SystemInteract
@@ -36,7 +37,7 @@ parser.add_argument(
     '--run-node-deployment',
     default=0,
     type=int,
-    help='Run node deployments for a given number of nodes'
+    help='Run node deployments for a given number of nodes, together with --run-default-deployment nodes are deployed with CENM'
 )
 parser.add_argument(
     '--deploy-without-angel',
@@ -83,13 +84,107 @@ parser.add_argument(
     '--health-check-frequency',
     type=int,
     default=30,
-    help='Time to wait between each health check, default is 30 seconds'
+    help='Time between logging the state and restarts of running services, stopped services are restarted with backoff, default is 30 seconds'
+)
+parser.add_argument(
+    '--sample-interval',
+    type=int,
+    default=5,
+    help='Time between sampling the CPU, memory, threads and open files of running services, default is 5 seconds'
+)
+parser.add_argument(
+    '--resource-samples',
+    default=None,
+    type=str,
+    help='Write the resources sampled from running services to a .csv or .json file on shutdown'
+)
+parser.add_argument(
+    '--trace',
+    nargs='?',
+    const='auto',
+    default=None,
+    metavar='TRACE_FILE',
+    help='Write a Chrome trace of the deployment steps to a .json file, cenm-trace-<time>.json if no file is given, and log the critical path once every service is ready'
+)
+parser.add_argument(
+    '--download-workers',
+    type=int,
+    default=4,
+    help='Number of artifacts to download in parallel, default is 4'
+)
+parser.add_argument(
+    '--download-backend',
+    type=str,
+    default='curl',
+    choices=['curl', 'python'],
+    help='Download artifacts with curl or natively in python over pooled keep-alive connections, default is curl'
+)
+parser.add_argument(
+    '--jvm-profile',
+    type=str,
+    default='default',
+    choices=['default', 'standard', 'small'],
+    help='JVM heap, GC and startup flags of the deployed services: default leaves the JVM defaults, standard bounds the heaps, small fits many services on a small machine'
+)
+parser.add_argument(
+    '--cds',
+    default=False,
+    action='store_true',
+    help='Build a class data sharing archive of every jar run with java 13 or later on its first run and use it to start faster on later runs'
+)
+parser.add_argument(
+    '--switch-versions',
+    default=False,
+    action='store_true',
+    help='Switch all artifacts to the versions in .env using previously downloaded versions, without downloading'
 )
 parser.add_argument(
     '--validate',
     default=False, 
     action='store_true',
-    help='Check which artifacts are present'
+    help='Check which artifacts are present, validate their checksums and show artifact cache statistics'
+)
+parser.add_argument(
+    '--timings',
+    default=False,
+    action='store_true',
+    help='Show the recorded startup times of every service'
+)
+parser.add_argument(
+    '--status',
+    default=False,
+    action='store_true',
+    help='Show the services of the running deployment with their state, pid, ports and restarts'
+)
+parser.add_argument(
+    '--stop',
+    nargs='?',
+    const='all',
+    default=None,
+    metavar='SERVICE',
+    help='Stop a service of the running deployment, or the whole deployment if no service is given'
+)
+parser.add_argument(
+    '--restart',
+    nargs='?',
+    const='all',
+    default=None,
+    metavar='SERVICE',
+    help='Restart a service of the running deployment, or every service if no service is given'
+)
+parser.add_argument(
+    '--snapshot',
+    default=None,
+    type=str,
+    metavar='NAME',
+    help='Save the runtime state of the stopped, bootstrapped network as a snapshot'
+)
+parser.add_argument(
+    '--restore',
+    default=None,
+    type=str,
+    metavar='NAME',
+    help='Restore the runtime state of a snapshot, so the next deployment skips bootstrapping the network'
 )
 parser.add_argument(
     '--version', 
@@ -156,13 +251,29 @@ def validate_arguments(args: argparse.Namespace):
         args.run_node_deployment,
         args.nodes,
         args.version, 
+        args.timings,
+        args.status,
+        (args.stop is not None),
+        (args.restart is not None),
+        (args.snapshot is not None),
+        (args.restore is not None),
         (args.health_check_frequency != 30), 
+        (args.sample_interval != 5),
+        (not not args.resource_samples),
+        (args.trace is not None),
+        (args.jvm_profile != 'default'),
+        args.cds,
+        args.switch_versions,
         (not not args.download_individual),  
         (not not args.clean_individual_artifacts), 
         args.validate
     ]
     if args.validate and sum(all_args) > 1:
         raise ValueError("Cannot use --validate with any other flag")
+    if (args.status or args.stop or args.restart) and sum(all_args) > 1:
+        raise ValueError("Cannot use --status, --stop or --restart with any other flag")
+    if (args.snapshot or args.restore) and sum(all_args) > 1:
+        raise ValueError("Cannot use --snapshot or --restore with any other flag")
     if args.download_individual and sum(all_args) > 1:
         raise ValueError("Cannot use --download-individual with any other flag")
     if args.download_individual == "":
@@ -171,14 +282,32 @@ def validate_arguments(args: argparse.Namespace):
         raise ValueError("Cannot use --clean-individual-artifacts with any other flag")
     if args.clean_individual_artifacts == "":
         raise ValueError("Cannot use --clean-individual-artifacts without specifying artifacts to clean")
-    if args.health_check_frequency != 30 and not args.run_default_deployment:
-        warnings.warn("--health-check-frequency is not needed without --run-default-deployment")
+    if args.health_check_frequency != 30 and not (args.run_default_deployment or args.run_node_deployment):
+        warnings.warn("--health-check-frequency is not needed without --run-default-deployment or --run-node-deployment")
+    if args.download_workers != 4 and not args.setup_dir_structure:
+        warnings.warn("--download-workers is not needed without --setup-dir-structure")
+    if args.download_backend != 'curl' and not (args.setup_dir_structure or args.download_individual):
+        warnings.warn("--download-backend is not needed without --setup-dir-structure or --download-individual")
+    if args.download_workers < 1:
+        raise ValueError("Smallest value for --download-workers is 1")
     if args.health_check_frequency < 10:
         raise ValueError("Smallest value for --health-check-frequency is 10 seconds")
+    if (args.sample_interval != 5 or args.resource_samples) and not (args.run_default_deployment or args.run_node_deployment):
+        warnings.warn("--sample-interval and --resource-samples are not needed without --run-default-deployment or --run-node-deployment")
+    if args.jvm_profile != 'default' and not (args.run_default_deployment or args.run_node_deployment):
+        warnings.warn("--jvm-profile is not needed without --run-default-deployment or --run-node-deployment")
+    if args.cds and not (args.run_default_deployment or args.run_node_deployment or args.generate_certs):
+        warnings.warn("--cds is not needed without --run-default-deployment, --run-node-deployment or --generate-certs")
+    if args.trace and not (args.run_default_deployment or args.run_node_deployment):
+        warnings.warn("--trace is not needed without --run-default-deployment or --run-node-deployment")
+    if args.trace and args.trace != 'auto' and not args.trace.endswith('.json'):
+        raise ValueError("--trace must be a .json file")
+    if args.sample_interval < 1:
+        raise ValueError("Smallest value for --sample-interval is 1 second")
+    if args.resource_samples and not args.resource_samples.endswith(('.csv', '.json')):
+        raise ValueError("--resource-samples must be a .csv or .json file")
     if args.run_node_deployment < 0 or args.run_node_deployment > 9:
         raise ValueError("Please specify between 0 and 9 nodes")
-    if args.run_default_deployment and args.run_node_deployment:
-        raise ValueError("Please only run one deployment at a time")
     if args.deploy_without_angel and not args.run_default_deployment:
         raise ValueError("Cannot use --deploy-without-angel without --run-default-deployment")
     if args.run_default_deployment:
@@ -212,6 +341,10 @@ def main(args: argparse.Namespace):
         args.deploy_without_angel
     )
 
+    service_manager.set_download_backend(args.download_backend)
+    service_manager.set_jvm_profile(args.jvm_profile)
+    service_manager.set_cds(args.cds)
+
     if args.download_individual:
         services = [arg.strip() for arg in args.download_individual.split(',')]
         service_manager.download_specific(services)
@@ -231,20 +364,43 @@ def main(args: argparse.Namespace):
     if args.version:
         service_manager.versions()
 
+    if args.timings:
+        service_manager.timings()
+
+    if args.status:
+        service_manager.status()
+
+    if args.stop:
+        service_manager.stop(args.stop)
+
+    if args.restart:
+        service_manager.restart(args.restart)
+
+    if args.snapshot:
+        service_manager.snapshot(args.snapshot)
+
+    if args.restore:
+        service_manager.restore(args.restore)
+
     if args.validate:
-        service_manager.check_all()
+        service_manager.validate()
+
+    if args.switch_versions:
+        service_manager.switch_versions()
 
     if args.setup_dir_structure:
-        service_manager.download_all()
+        service_manager.download_all(args.download_workers)
 
     if args.generate_certs:
         service_manager.generate_certificates()
 
+    trace_file = f'cenm-trace-{strftime("%Y%m%d-%H%M%S")}.json' if args.trace == 'auto' else args.trace
+
     if args.run_default_deployment:
-        service_manager.deploy_all(args.health_check_frequency)
+        service_manager.deploy_all(args.health_check_frequency, args.sample_interval, args.resource_samples, trace_file)
 
-    if args.run_node_deployment:
-        service_manager.deploy_nodes(args.health_check_frequency)
+    if args.run_node_deployment and not args.run_default_deployment:
+        service_manager.deploy_nodes(args.health_check_frequency, args.sample_interval, args.resource_samples, trace_file)
 
 if __name__ == '__main__':
     main(parser.parse_args())
\ No newline at end of file